@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "feedreader.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+import feeds.clients as clients  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Django doesn't handle lifespan events, which are used here to close the
+    # pooled HTTP client shared by crawls when the server shuts down
+    if scope["type"] != "lifespan":
+        return await django_application(scope, receive, send)
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await clients.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "feedreader.settings")
@@ -17,6 +18,14 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
+@worker_process_shutdown.connect
+def close_http_clients(**kwargs):
+    # Tasks share a pooled HTTP client per worker process, see feeds.clients
+    import feeds.clients as clients
+
+    clients.close()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
@@ -23,6 +23,16 @@ env = environ.Env(
         str,
         "django-insecure-+l=yrd#r#nfshb!(xn4i#&8^_-q*yr38pyt9(j6rr2o^q&4z3r",
     ),
+    FEEDS_LAZY_SANITIZE=(bool, False),
+    FEEDS_CRAWL_CONCURRENCY=(int, 8),
+    FEEDS_CRAWL_DEADLINE=(float, 15.0),
+    FEEDS_DISCOVERY_TTL=(int, 60 * 60 * 24),
+    FEEDS_DISCOVERY_NEGATIVE_TTL=(int, 60 * 60),
+    FEEDS_DNS_CACHE_TTL=(int, 300),
+    FEEDS_DISCOVERY_MAX_JOBS=(int, 50),
+    FEEDS_DISCOVERY_MAX_USER_JOBS=(int, 2),
+    FEEDS_CRAWL_MAX_REQUESTS=(int, 32),
+    FEEDS_CRAWL_MAX_BYTES=(int, 5 * 1024 * 1024),
 )
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -217,11 +227,63 @@ CSRF_TRUSTED_ORIGINS = [f"https://{HOSTNAME}"]
 CELERY_RESULT_BACKEND = "django-db"
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 
+# The web process and the workers share state through the cache (discovery
+# jobs, admission slots and page versions), so it has to be shared between
+# them and defaults to the Redis Celery already needs
+CACHES = {"default": env.cache("CACHE_URL", default=CELERY_BROKER_URL)}
+
+# The tests run in a single process against a memory cache, see feedreader.runner
+TEST_RUNNER = "feedreader.runner.TestRunner"
+
 CELERY_BEAT_SCHEDULE = {
     "update": {
         "task": "feeds.tasks.update",
         "schedule": crontab(minute=0, hour="*/1"),
     },
+    "reconcile-counters": {
+        "task": "feeds.tasks.reconcile_counters",
+        "schedule": crontab(minute=30, hour=3),
+    },
 }
 
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+
+# Discovery crawls (and OPML imports) run on their own workers so a burst of
+# them can't hold up feed updates
+CELERY_TASK_ROUTES = {
+    "feeds.tasks.discover": {"queue": "discover"},
+    "feeds.tasks.import_feeds": {"queue": "discover"},
+}
+
+# Store raw entry content at ingest and sanitize it the first time an entry is
+# rendered, rather than cleaning every entry up front
+FEEDS_LAZY_SANITIZE = env("FEEDS_LAZY_SANITIZE")
+
+# Maximum number of candidate URLs probed at once by a single crawl, and the
+# overall time limit (in seconds) for discovering a feed
+FEEDS_CRAWL_CONCURRENCY = env("FEEDS_CRAWL_CONCURRENCY")
+FEEDS_CRAWL_DEADLINE = env("FEEDS_CRAWL_DEADLINE")
+
+# How long (in seconds) to remember the feed discovered for a URL, and how
+# long to remember that a URL has no feed at all
+FEEDS_DISCOVERY_TTL = env("FEEDS_DISCOVERY_TTL")
+FEEDS_DISCOVERY_NEGATIVE_TTL = env("FEEDS_DISCOVERY_NEGATIVE_TTL")
+
+# Extra blog platforms to skip crawling for, as a dict of host suffixes to
+# dotted paths of functions that build the feed URL, see feeds.hosts
+FEEDS_HOST_RULES = {}
+
+# How long (in seconds) the shared crawler HTTP client caches DNS lookups for
+FEEDS_DNS_CACHE_TTL = env("FEEDS_DNS_CACHE_TTL")
+
+# Maximum number of discovery jobs queued or running at once, overall and per
+# user, further requests are turned away until a slot frees up
+FEEDS_DISCOVERY_MAX_JOBS = env("FEEDS_DISCOVERY_MAX_JOBS")
+FEEDS_DISCOVERY_MAX_USER_JOBS = env("FEEDS_DISCOVERY_MAX_USER_JOBS")
+
+# Maximum number of requests and bytes downloaded by a single crawl
+FEEDS_CRAWL_MAX_REQUESTS = env("FEEDS_CRAWL_MAX_REQUESTS")
+FEEDS_CRAWL_MAX_BYTES = env("FEEDS_CRAWL_MAX_BYTES")
+
+# Redis used to push new entries to open tabs, see feeds.live
+FEEDS_LIVE_URL = os.getenv("FEEDS_LIVE_URL", CELERY_BROKER_URL)
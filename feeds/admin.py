@@ -1,7 +1,8 @@
 from django.contrib import admin
-from django.db.models.aggregates import Count
 
-from .models import Category, Entry, Feed, Subscription
+import feeds.counters as counters
+
+from .models import Category, Entry, Feed, ImportRecord, Subscription
 
 
 @admin.register(Feed)
@@ -36,8 +37,11 @@ class FeedAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         queryset = super(FeedAdmin, self).get_queryset(request)
-        return queryset.annotate(subscribers=Count("subscriptions"))
+        return queryset.annotate(
+            subscribers=counters.lookup(counters.SUBSCRIBERS, "pk")
+        )
 
+    @admin.display(ordering="subscribers")
     def subscribers(self, obj):
         return obj.subscribers
 
@@ -57,3 +61,10 @@ class EntryAdmin(admin.ModelAdmin):
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ("feed", "user", "category")
     search_fields = ["feed__title", "user__username", "user__email"]
+
+
+@admin.register(ImportRecord)
+class ImportRecordAdmin(admin.ModelAdmin):
+    list_display = ("url", "user", "state", "attempts", "next_attempt_at")
+    list_filter = ("state",)
+    search_fields = ["url", "user__username", "reason"]
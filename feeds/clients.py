@@ -0,0 +1,137 @@
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+import weakref
+
+import httpcore
+import httpx
+from django.conf import settings
+from httpcore.backends.base import AsyncNetworkBackend
+
+timeout = httpx.Timeout(10.0)
+limits = httpx.Limits(
+    max_keepalive_connections=None, max_connections=None, keepalive_expiry=10
+)
+
+# Process wide, hostname -> (expires, addresses)
+dns_cache = {}
+
+# One pooled client per event loop, as connections can't be shared across loops
+_clients = weakref.WeakKeyDictionary()
+
+_local = threading.local()
+
+
+def is_ip_address(host):
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+class CachingResolverBackend(AsyncNetworkBackend):
+    """Wraps a httpcore network backend, caching DNS lookups for a fixed TTL"""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def resolve(self, host, port):
+        if is_ip_address(host):
+            return [host]
+
+        cached = dns_cache.get(host)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as err:
+            raise httpcore.ConnectError(str(err)) from err
+
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        dns_cache[host] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None):
+        # TLS still verifies against the original hostname, which httpcore
+        # passes separately when starting TLS over the returned stream
+        error = None
+        for address in await self.resolve(host, port):
+            try:
+                return await self.backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as err:
+                error = err
+
+        dns_cache.pop(host, None)
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None):
+        return await self.backend.connect_unix_socket(path, timeout=timeout)
+
+    async def sleep(self, seconds):
+        await self.backend.sleep(seconds)
+
+
+class CachingResolverTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, *args, dns_ttl, **kwargs):
+        super().__init__(*args, **kwargs)
+        # httpx has no way to pass a network backend through, so it's swapped
+        # on the pool, httpx and httpcore are pinned in the Pipfile for this
+        self._pool._network_backend = CachingResolverBackend(
+            self._pool._network_backend, dns_ttl
+        )
+
+
+def make_client():
+    return httpx.AsyncClient(
+        timeout=timeout,
+        transport=CachingResolverTransport(
+            limits=limits, dns_ttl=settings.FEEDS_DNS_CACHE_TTL
+        ),
+    )
+
+
+def get_client():
+    """Returns the shared, keep-alive client for the running event loop"""
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = make_client()
+    return client
+
+
+async def aclose():
+    """Closes the shared client belonging to the running event loop"""
+
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def run(coro):
+    """
+    Like asyncio.run, but keeps reusing one event loop per thread so that
+    pooled connections survive between calls, i.e. across Celery tasks
+    """
+
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _local.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coro)
+
+
+def close():
+    """Shuts down the event loop used by run, and its shared client"""
+
+    loop = getattr(_local, "loop", None)
+    if loop is not None and not loop.is_closed():
+        loop.run_until_complete(aclose())
+        loop.close()
@@ -0,0 +1,158 @@
+"""
+Counts that are kept up to date as entries, subscriptions and read state
+change, so pages look them up instead of aggregating. Each is a Counter row
+named by its kind and ids, like "subscribers:12". reconcile recomputes them
+from scratch to correct any drift
+"""
+
+from django.db import connection
+from django.db.models import CharField, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Concat
+
+from feeds.models import Category, Counter, Entry, Subscription
+
+# A feed's entries, by feed id
+ENTRIES = "entries"
+# A feed's subscribers, by feed id
+SUBSCRIBERS = "subscribers"
+# The subscriptions in a category, by category id
+SUBSCRIPTIONS = "subscriptions"
+# A user's unread entries in a feed, by user id then feed id
+UNREAD = "unread"
+
+# Counters written or deleted per statement
+BATCH_SIZE = 500
+
+TABLE = Counter._meta.db_table
+
+ADD_SQL = f"""
+    INSERT INTO {TABLE} (name, value) VALUES (%s, %s)
+    ON CONFLICT (name) DO UPDATE SET value = {TABLE}.value + excluded.value
+"""
+
+UPDATE_SQL = f"UPDATE {TABLE} SET value = value + %s WHERE name = %s"
+
+
+def key(kind, *ids):
+    return ":".join([kind, *(str(pk) for pk in ids)])
+
+
+def lookup(kind, *refs):
+    """
+    An expression for annotating querysets with a counter, refs name the
+    fields holding its ids. Counters that don't exist are 0
+    """
+
+    parts = [Value(kind)]
+    for ref in refs:
+        parts += [Value(":"), Cast(OuterRef(ref), output_field=CharField())]
+    name = Concat(*parts, output_field=CharField())
+    return Coalesce(Subquery(Counter.objects.filter(name=name).values("value")[:1]), 0)
+
+
+def get_many(names):
+    """Name -> value for the names given, missing counters are 0"""
+
+    values = dict.fromkeys(names, 0)
+    values.update(Counter.objects.filter(name__in=values).values_list("name", "value"))
+    return values
+
+
+def add(deltas, create=True):
+    """
+    Adds {name: delta} to counters, without reading them first. Unless create
+    is set, counters that don't exist yet are left alone
+    """
+
+    if create:
+        sql, params = ADD_SQL, [(name, delta) for name, delta in deltas.items()]
+    else:
+        sql, params = UPDATE_SQL, [(delta, name) for name, delta in deltas.items()]
+    params = [row for row in params if row[0] and row[1]]
+    if params:
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+
+def set_many(values):
+    Counter.objects.bulk_create(
+        [Counter(name=name, value=value) for name, value in values.items()],
+        update_conflicts=True,
+        unique_fields=["name"],
+        update_fields=["value"],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def clear(names):
+    """Zeros the counters that exist out of names"""
+
+    Counter.objects.filter(name__in=names).update(value=0)
+
+
+def delete(names):
+    names = list(names)
+    for i in range(0, len(names), BATCH_SIZE):
+        Counter.objects.filter(name__in=names[i : i + BATCH_SIZE]).delete()
+
+
+def replace(kind, counts):
+    """Replaces every counter of a kind with counts, {ids: value}"""
+
+    values = {key(kind, *ids): value for ids, value in counts.items()}
+    existing = Counter.objects.filter(name__startswith=f"{kind}:").values_list(
+        "name", flat=True
+    )
+    delete([name for name in existing.iterator() if name not in values])
+    set_many(values)
+
+
+def count_entries(entries):
+    """Counts newly ingested entries"""
+
+    deltas = {}
+    for entry in entries:
+        name = key(ENTRIES, entry.feed_id)
+        deltas[name] = deltas.get(name, 0) + 1
+    add(deltas)
+
+
+def grouped_counts(queryset, *fields):
+    """{ids: count} for the rows of queryset grouped by fields"""
+
+    return {
+        tuple(row[:-1]): row[-1]
+        for row in queryset.order_by().values_list(*fields).annotate(Count("pk"))
+    }
+
+
+def refresh_subscriptions(user_id, feed_ids):
+    """Recounts what depends on a user's subscriptions to the feeds"""
+
+    subscribers = grouped_counts(
+        Subscription.objects.filter(feed_id__in=feed_ids), "feed_id"
+    )
+    values = {key(SUBSCRIBERS, pk): subscribers.get((pk,), 0) for pk in feed_ids}
+
+    categories = (
+        Category.objects.filter(user_id=user_id)
+        .order_by()
+        .values_list("pk")
+        .annotate(Count("subscriptions"))
+    )
+    values.update((key(SUBSCRIPTIONS, pk), count) for pk, count in categories)
+
+    set_many(values)
+
+
+def reconcile():
+    """Recomputes the feed and category counters from scratch"""
+
+    replace(ENTRIES, grouped_counts(Entry.objects.all(), "feed_id"))
+    replace(SUBSCRIBERS, grouped_counts(Subscription.objects.all(), "feed_id"))
+    replace(
+        SUBSCRIPTIONS,
+        grouped_counts(
+            Subscription.objects.filter(category__isnull=False), "category_id"
+        ),
+    )
@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import io
 import logging
 import os
@@ -6,79 +8,29 @@ import re
 from urllib.parse import urljoin, urlparse
 
 import httpx
-from bs4 import BeautifulSoup
+from django.conf import settings
 from django.core.files.images import ImageFile
 from django.db import IntegrityError, transaction
+from lxml import etree
 from PIL import Image, UnidentifiedImageError
 
+import feeds.clients as clients
+import feeds.counters as counters
+import feeds.favicons as favicons
+import feeds.hosts as hosts
 import feeds.parser as parser
 from feeds.models import Entry, Feed
+from feeds.scanner import COMMON_FAVICONS, DiscoveryScanner, html_parser
 
 USER_AGENT = "feedreader/1 +https://github.com/Jackevansevo/feedreader/"
 
 
 logger = logging.getLogger(__name__)
 
-timeout = httpx.Timeout(10.0)
-limits = httpx.Limits(
-    max_keepalive_connections=None, max_connections=None, keepalive_expiry=10
-)
-
 
 def translate_common_feed_extensions(url):
-    parsed = urlparse(url)
-
-    if parsed.netloc.endswith("wordpress.com") or parsed.netloc.endswith(
-        "bearblog.dev"
-    ):
-        if not parsed.path.rstrip("/").endswith("/feed"):
-            return parsed._replace(path=f"{parsed.path.strip('/')}/feed/").geturl()
-    elif parsed.netloc.endswith("substack.com"):
-        if not parsed.path.endswith("/feed"):
-            return parsed._replace(path=f"{parsed.path}/feed").geturl()
-    elif parsed.netloc.endswith("tumblr.com"):
-        if parsed.path != "/rss":
-            return urljoin(url, "rss")
-    elif parsed.netloc.endswith("medium.com"):
-        if not parsed.path.startswith("/feed"):
-            return parsed._replace(path=f"feed{parsed.path}").geturl()
-    elif parsed.netloc.endswith("blogspot.com"):
-        if parsed.path != "/feeds/posts/default":
-            return urljoin(url, "feeds/posts/default")
-
-    return url
-
-
-def find_favicons(base_url, soup):
-    favicons = []
-
-    for favicon_link in soup.findAll(
-        "link", {"rel": re.compile(r".*icon.*"), "href": re.compile(r"^(?!data).*$")}
-    ):
-        favicons.append(urljoin(base_url, favicon_link["href"]))
-
-    # Fall back to checking common extensions
-    for extension in ("/favicon.ico", "/favicon.png"):
-        favicon_loc = urljoin(base_url, extension)
-        if favicon_loc not in favicons:
-            favicons.append(favicon_loc)
-
-    return favicons
-
-
-def find_rss_link(soup):
-    rss_link = soup.find("link", {"type": re.compile(r"application\/(atom|rss)\+xml$")})
-
-    if rss_link is None:
-        rss_link = soup.find("a", string=re.compile("rss", re.I))
-
-    if rss_link is None:
-        rss_link = soup.find("a", {"href": re.compile(r"(index|feed|rss|atom).*.xml$")})
-
-    if rss_link is None:
-        rss_link = soup.find("a", {"href": re.compile(r".*(rss|atom)$")})
-
-    return rss_link
+    feed_url = hosts.rules.translate(urlparse(url))
+    return feed_url if feed_url is not None else url
 
 
 def find_common_extensions(parsed_url):
@@ -140,25 +92,209 @@ async def scrape_common_endpoints(client, parsed_url):
                 return resp
 
 
-async def check_favicon(client, path):
-    # Verify the favicon exists
-    try:
-        resp = await client.get(
-            path, follow_redirects=True, headers={"User-Agent": USER_AGENT}
+# How much of a response is downloaded before deciding if it's worth fetching
+PROBE_BYTES = 4096
+
+IMAGE_SIGNATURES = (
+    b"\x89PNG\r\n\x1a\n",
+    b"\x00\x00\x01\x00",  # ico
+    b"GIF87a",
+    b"GIF89a",
+    b"\xff\xd8\xff",  # jpeg
+    b"BM",
+)
+
+# Headers describing the body as it was sent, which no longer hold once read
+TRANSFER_HEADERS = (
+    "content-encoding",
+    "content-length",
+    "content-range",
+    "transfer-encoding",
+)
+
+FEED_PATTERN = re.compile(rb"<(?:\w+:)?(rss|feed|rdf)[\s>]", re.I)
+
+
+def is_html(content_type, prefix):
+    # Content type can't always be trusted
+    return (
+        content_type is not None
+        and "html" in content_type
+        and not prefix[:5].decode(errors="ignore").startswith("<?xml")
+    )
+
+
+def looks_like_feed(prefix):
+    return FEED_PATTERN.search(prefix) is not None
+
+
+def looks_like_image(prefix):
+    if prefix[:4] == b"RIFF" and prefix[8:12] == b"WEBP":
+        return True
+    return prefix.startswith(IMAGE_SIGNATURES)
+
+
+def is_complete(resp, prefix):
+    # i.e. Content-Range: bytes 0-1023/1024
+    _, _, total = resp.headers.get("content-range", "").partition("/")
+    return total.isdigit() and int(total) == len(prefix)
+
+
+class BudgetExceeded(Exception):
+    """Raised when a crawl has made too many requests or downloaded too much"""
+
+
+class Budget:
+    """Tracks the requests made and bytes downloaded by a single crawl"""
+
+    def __init__(self, max_requests=None, max_bytes=None):
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.requests = 0
+        self.bytes = 0
+
+    def request(self):
+        self.requests += 1
+        if self.max_requests is not None and self.requests > self.max_requests:
+            raise BudgetExceeded(f"Exceeded {self.max_requests} requests")
+
+    def consume(self, size):
+        self.bytes += size
+        if self.max_bytes is not None and self.bytes > self.max_bytes:
+            raise BudgetExceeded(f"Exceeded {self.max_bytes} bytes")
+
+
+class Probe:
+    """A streamed response, with the first PROBE_BYTES of the body read"""
+
+    def __init__(self, resp, prefix, chunks, budget):
+        self.resp = resp
+        self.prefix = prefix
+        self.chunks = chunks
+        self.budget = budget
+
+    @property
+    def content_type(self):
+        return self.resp.headers.get("content-type")
+
+    @property
+    def partial(self):
+        return self.resp.status_code == 206 and not is_complete(self.resp, self.prefix)
+
+    async def iter_rest(self, client):
+        """Yields the remainder of the body following the prefix"""
+
+        if not self.partial:
+            async for chunk in self.chunks:
+                self.budget.consume(len(chunk))
+                yield chunk
+            return
+
+        # The server honoured the range, so the rest needs another request
+        skip = len(self.prefix)
+        self.budget.request()
+        async with client.stream(
+            "GET",
+            str(self.resp.url),
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT, "Range": f"bytes={skip}-"},
+        ) as resp:
+            if resp.status_code == 416:
+                # The prefix was the whole body after all
+                return
+            resp.raise_for_status()
+            if resp.status_code == 206:
+                # Only what follows the prefix was sent
+                skip = 0
+            async for chunk in resp.aiter_bytes():
+                self.budget.consume(len(chunk))
+                if skip:
+                    chunk, skip = chunk[skip:], max(skip - len(chunk), 0)
+                if chunk:
+                    yield chunk
+
+    async def read(self, client):
+        """Downloads the rest of the body, returning the complete response"""
+
+        content = self.prefix + b"".join(
+            [chunk async for chunk in self.iter_rest(client)]
         )
-    except httpx.HTTPError:
-        return
 
-    if resp.status_code != 200:
+        headers = [
+            (key, value)
+            for key, value in self.resp.headers.multi_items()
+            if key not in TRANSFER_HEADERS
+        ]
+        return httpx.Response(
+            200,
+            headers=headers,
+            content=content,
+            request=self.resp.request,
+            history=self.resp.history,
+        )
+
+
+@contextlib.asynccontextmanager
+async def open_probe(client, url, budget=None):
+    """Requests just the first PROBE_BYTES of url (Range: bytes=0-4095)"""
+
+    if budget is None:
+        budget = Budget()
+
+    budget.request()
+    request = client.build_request(
+        "GET",
+        url,
+        headers={"User-Agent": USER_AGENT, "Range": f"bytes=0-{PROBE_BYTES - 1}"},
+    )
+    resp = await client.send(request, stream=True, follow_redirects=True)
+
+    try:
+        resp.raise_for_status()
+
+        chunks = resp.aiter_bytes()
+        prefix = b""
+        async for chunk in chunks:
+            budget.consume(len(chunk))
+            prefix += chunk
+            if len(prefix) >= PROBE_BYTES:
+                break
+
+        yield Probe(resp, prefix, chunks, budget)
+    finally:
+        await resp.aclose()
+
+
+async def fetch_confirmed(client, url, confirm, budget=None):
+    """
+    Requests the first PROBE_BYTES of url and downloads the rest of the body
+    only if confirm(resp, prefix) accepts the candidate, otherwise returns None
+    """
+    async with open_probe(client, url, budget) as probe:
+        if confirm(probe.resp, probe.prefix):
+            return await probe.read(client)
+
+
+def accept_favicon(resp, prefix):
+    return not is_html(resp.headers.get("content-type"), prefix) and looks_like_image(
+        prefix
+    )
+
+
+async def check_favicon(client, path, budget=None):
+    # Verify the favicon exists
+    try:
+        resp = await fetch_confirmed(client, path, accept_favicon, budget)
+    except (httpx.HTTPError, BudgetExceeded):
         return
 
-    if "html" in resp.headers["content-type"]:
+    if resp is None:
         return
 
     try:
-        img = Image.open(resp)
+        img = Image.open(io.BytesIO(resp.content))
         img.verify()
-    except UnidentifiedImageError:
+    except (UnidentifiedImageError, SyntaxError, OSError):
         return
     else:
         parsed = urlparse(str(resp.url))
@@ -167,21 +303,36 @@ async def check_favicon(client, path):
 
 
 async def crawl(url):
-    async with httpx.AsyncClient() as client:
-        return await Crawler(client, url).crawl()
+    return await Crawler(clients.get_client(), url).crawl()
 
 
 class Crawler:
-    def __init__(self, client, url):
+    def __init__(self, client, url, concurrency=None, deadline=None, budget=None):
+        self.url = url
         self.targets = [url]
         self.crawled = set()
         self.client = client
 
+        if concurrency is None:
+            concurrency = settings.FEEDS_CRAWL_CONCURRENCY
+        if deadline is None:
+            deadline = settings.FEEDS_CRAWL_DEADLINE
+
+        # Caps the number of candidate URLs being probed at once
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.deadline = deadline
+
+        if budget is None:
+            budget = Budget(
+                settings.FEEDS_CRAWL_MAX_REQUESTS, settings.FEEDS_CRAWL_MAX_BYTES
+            )
+        self.budget = budget
+
         self.feed = None
         self.feed_resp = None
 
         self.html_resp = None
-        self.soup = None
+        self.scanner = None
 
     def sanitize_target(self, target_url):
         parsed_target = urlparse(target_url)
@@ -195,68 +346,142 @@ class Crawler:
         if sanitized_target not in self.crawled:
             self.targets.append(target_url)
 
+    async def scan_page(self, probe):
+        """Streams a HTML page through the scanner, stopping as early as possible"""
+
+        scanner = DiscoveryScanner(str(probe.resp.url))
+        html = html_parser(scanner, probe.resp.charset_encoding)
+
+        html.feed(probe.prefix)
+        if not scanner.done:
+            async with contextlib.aclosing(probe.iter_rest(self.client)) as chunks:
+                async for chunk in chunks:
+                    html.feed(chunk)
+                    if scanner.done:
+                        break
+
+        html.close()
+        return scanner
+
     async def crawl_url(self, url):
         parsed_url = urlparse(url)
 
         try:
-            resp = await self.client.get(
-                url, follow_redirects=True, headers={"User-Agent": USER_AGENT}
-            )
-            resp.raise_for_status()
+            async with open_probe(self.client, url, self.budget) as probe:
+                if is_html(probe.content_type, probe.prefix):
+                    if self.html_resp is None:
+                        logger.info("{} returned HTML response".format(url))
+                        self.html_resp = probe.resp
+                        self.scanner = await self.scan_page(probe)
+                        resp = None
+                    else:
+                        return
+                elif self.feed is None and (
+                    looks_like_feed(probe.prefix) or "xml" in (probe.content_type or "")
+                ):
+                    resp = await probe.read(self.client)
+                else:
+                    logger.info("{} is not a page or feed: skipping".format(url))
+                    return
         except httpx.HTTPError as err:
             logger.error(str(err))
+            return
+
+        if resp is None:
+            if self.feed is None:
+                # Links to other sites are skipped
+                feed_links = [
+                    link
+                    for link in self.scanner.feed_links()
+                    if urlparse(link).netloc == parsed_url.netloc
+                ]
+
+                if feed_links:
+                    logger.info(
+                        "Found feed link: {} in page body of {}".format(
+                            feed_links[0], self.html_resp.url
+                        )
+                    )
+                    self.add_target(feed_links[0])
+                else:
+                    logger.info("No feed link in page body for {}".format(url))
+
         else:
+            self.feed = parser.parse(io.BytesIO(resp.content))
+            self.feed_resp = resp
+
+            if self.html_resp is None:
+                # Try to infer the site url from the parsed feed
+                parsed_link = self.feed.get("link")
+                if parsed_link:
+                    link = urljoin(str(resp.url), parsed_link)
+                    logger.info(
+                        "Found site link: {} in parsed feed {}".format(link, resp.url)
+                    )
+                    self.add_target(link)
+
+    async def probe(self, url):
+        def accept_feed(resp, prefix):
+            return not is_html(
+                resp.headers.get("content-type"), prefix
+            ) and looks_like_feed(prefix)
+
+        async with self.semaphore:
+            logger.info("Trying {}".format(url))
+            try:
+                resp = await fetch_confirmed(self.client, url, accept_feed, self.budget)
+            except httpx.HTTPError as err:
+                logger.info(str(err))
+                return
+
+        if resp is None:
+            return
 
-            # Content type can't always be trusted
-            content_type = resp.headers.get("content-type")
+        try:
+            parsed = parser.parse(io.BytesIO(resp.content))
+        except (parser.ParseException, NotImplementedError, etree.XMLSyntaxError):
+            return
 
-            if (
-                content_type is not None
-                and "html" in content_type
-                and self.html_resp is None
-                and not resp.content[:5].decode().startswith("<?xml")
-            ):
-                logger.info("{} returned HTML response".format(url))
+        return resp, parsed
 
-                self.html_resp = resp
+    async def probe_candidates(self, urls):
+        """
+        Probes candidate feed URLs concurrently, returning the first response
+        that parses as a feed and cancelling any requests still in flight
+        """
+        tasks = [asyncio.ensure_future(self.probe(url)) for url in urls]
 
-                # If we haven't scraped any HTML yet
-                self.soup = BeautifulSoup(resp, features="html.parser")
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result is not None:
+                    return result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
-                if self.feed is None:
-                    rss_link = find_rss_link(self.soup)
-
-                    if rss_link is not None:
-                        feed_url = urljoin(url, rss_link["href"])
-                        logger.info(
-                            "Found feed link: {} in page body of {}".format(
-                                feed_url, resp.url
-                            )
-                        )
-                        if urlparse(feed_url).netloc != parsed_url.netloc:
-                            logger.info("RSS links to different site: skipping")
-                        else:
-                            self.add_target(feed_url)
-                    else:
-                        logger.info("No feed link in page body for {}".format(url))
+    async def try_host_rule(self):
+        """Goes straight to the feed for sites on known blogging platforms"""
 
-            elif self.feed is None:
-                self.feed = parser.parse(io.BytesIO(resp.content))
-                self.feed_resp = resp
+        feed_url = hosts.rules.translate(urlparse(self.url))
+        if feed_url is None:
+            return False
 
-                if self.html_resp is None:
-                    # Try to infer the site url from the parsed feed
-                    parsed_link = self.feed.get("link")
-                    if parsed_link:
-                        link = urljoin(str(resp.url), parsed_link)
-                        logger.info(
-                            "Found site link: {} in parsed feed {}".format(
-                                link, resp.url
-                            )
-                        )
-                        self.add_target(link)
+        logger.info("Trying known feed location {} for {}".format(feed_url, self.url))
+        self.crawled.add(self.sanitize_target(feed_url))
 
-    async def crawl(self):
+        result = await self.probe(feed_url)
+        if result is None:
+            return False
+
+        self.feed_resp, self.feed = result
+        return True
+
+    async def discover(self):
+
+        if await self.try_host_rule():
+            return
 
         while self.targets:
             url = self.targets.pop()
@@ -269,9 +494,25 @@ class Crawler:
 
             if self.targets == []:
                 if self.feed is None:
-                    # Fall back to crawling common feed extensions
-                    for ext in find_common_extensions(parsed_url):
-                        self.add_target(ext)
+                    # Fall back to probing common feed extensions
+                    candidates = [
+                        ext
+                        for ext in find_common_extensions(parsed_url)
+                        if self.sanitize_target(ext) not in self.crawled
+                    ]
+                    self.crawled.update(map(self.sanitize_target, candidates))
+
+                    result = await self.probe_candidates(candidates)
+                    if result is not None:
+                        self.feed_resp, self.feed = result
+                        logger.info("Found feed at {}".format(self.feed_resp.url))
+
+                        if self.html_resp is None:
+                            parsed_link = self.feed.get("link")
+                            if parsed_link:
+                                self.add_target(
+                                    urljoin(str(self.feed_resp.url), parsed_link)
+                                )
 
                 if self.html_resp is None:
                     if parsed_url.path.endswith("/"):
@@ -282,13 +523,44 @@ class Crawler:
                         link = posixpath.dirname(url)
                         self.add_target(link)
 
+    async def find_favicon(self):
+        if self.scanner is not None:
+            candidates = self.scanner.favicons()
+        else:
+            # Without a page to look at, try the usual locations on the site
+            site = self.feed.get("link") or str(self.feed_resp.url)
+            base = urljoin(str(self.feed_resp.url), site)
+            candidates = [urljoin(base, loc) for loc in COMMON_FAVICONS]
+
+        # Check every candidate at once, preferring them in the order found
+        favicons = await asyncio.gather(
+            *(
+                check_favicon(self.client, favicon_loc, self.budget)
+                for favicon_loc in candidates
+            )
+        )
+        return next((favicon for favicon in favicons if favicon is not None), None)
+
+    async def crawl(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+
+        try:
+            await asyncio.wait_for(self.discover(), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            logger.info("Crawl deadline reached for {}".format(self.url))
+        except BudgetExceeded as err:
+            logger.info("Crawl budget used up for {}: {}".format(self.url, err))
+
         favicon = None
 
-        if self.html_resp is not None:
-            for favicon_loc in find_favicons(str(self.html_resp.url), self.soup):
-                favicon = await check_favicon(self.client, favicon_loc)
-                if favicon is not None:
-                    break
+        remaining = deadline - loop.time()
+
+        if (self.scanner is not None or self.feed is not None) and remaining > 0:
+            try:
+                favicon = await asyncio.wait_for(self.find_favicon(), remaining)
+            except asyncio.TimeoutError:
+                logger.info("Crawl deadline reached fetching favicon")
 
         return self.feed_resp, self.feed, favicon
 
@@ -300,15 +572,20 @@ def ingest_feed(resp, parsed, favicon):
     if not parsed:
         return None
 
+    if parsed["favicon"] is not None:
+        parsed["favicon"] = favicons.store(parsed["favicon"])
+
     try:
         with transaction.atomic():
             feed = Feed.objects.create(**parsed)
     except IntegrityError:
         raise
 
-    Entry.objects.bulk_create(
-        entry
-        for entry in (parser.parse_feed_entry(entry, feed) for entry in entries)
-        if entry is not None
+    counters.count_entries(
+        Entry.objects.bulk_create(
+            entry
+            for entry in (parser.parse_feed_entry(entry, feed) for entry in entries)
+            if entry is not None
+        )
     )
     return feed
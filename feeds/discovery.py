@@ -0,0 +1,153 @@
+import hashlib
+import uuid
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Cached in place of a feed URL when a crawl didn't turn up a feed
+NO_FEED = ""
+
+# How long a discovery job (and its status) is tracked for, in seconds
+JOB_TIMEOUT = 5 * 60
+
+
+def normalize_url(url):
+    """Reduces the different ways of typing a site address to a single form"""
+
+    if "://" not in url:
+        url = "http://" + url
+
+    parsed = urlparse(url.strip())
+    netloc = parsed.netloc.lower()
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+
+    normalized = netloc + parsed.path.rstrip("/")
+    if parsed.query:
+        normalized += "?" + parsed.query
+
+    return normalized
+
+
+def cache_key(url, suffix=""):
+    digest = hashlib.md5(normalize_url(url).encode()).hexdigest()
+    return f"feeds:discover:{digest}{suffix}"
+
+
+def lookup(url):
+    """
+    Returns a (found, feed_url) pair. When found is True feed_url is the URL of
+    the feed previously discovered for url, or None if url is known to have no
+    feed
+    """
+
+    feed_url = cache.get(cache_key(url))
+    if feed_url is None:
+        return False, None
+    return True, feed_url or None
+
+
+def remember(url, feed_url):
+    if feed_url:
+        cache.set(cache_key(url), feed_url, settings.FEEDS_DISCOVERY_TTL)
+    else:
+        cache.set(cache_key(url), NO_FEED, settings.FEEDS_DISCOVERY_NEGATIVE_TTL)
+
+
+class Saturated(Exception):
+    """Raised when there are too many discovery jobs to accept another"""
+
+
+def _acquire(key, limit):
+    cache.add(key, 0, JOB_TIMEOUT)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Expired between the add and incr
+        cache.add(key, 1, JOB_TIMEOUT)
+        count = 1
+
+    if count > limit:
+        cache.decr(key)
+        return False
+    return True
+
+
+def _release(key):
+    try:
+        cache.decr(key)
+    except ValueError:
+        pass
+
+
+def admit(user_id):
+    """
+    Reserves a slot for a discovery job, both overall (bounding the queue) and
+    for the given user, raising Saturated if either limit has been reached
+    """
+
+    if not _acquire("feeds:discover:jobs", settings.FEEDS_DISCOVERY_MAX_JOBS):
+        raise Saturated("Too many feeds are being looked up, try again shortly")
+
+    if not _acquire(
+        f"feeds:discover:jobs:{user_id}", settings.FEEDS_DISCOVERY_MAX_USER_JOBS
+    ):
+        _release("feeds:discover:jobs")
+        raise Saturated("You're already looking up too many feeds, try again shortly")
+
+
+def release(user_id):
+    _release("feeds:discover:jobs")
+    _release(f"feeds:discover:jobs:{user_id}")
+
+
+def start_job(url, user_id):
+    """
+    Returns the id of the background discovery job for url and whether it was
+    newly created, so that concurrent requests for the same site share a job
+    """
+
+    existing = cache.get(cache_key(url, ":job"))
+    if existing is not None:
+        return existing, False
+
+    admit(user_id)
+
+    job_id = uuid.uuid4().hex
+    if cache.add(cache_key(url, ":job"), job_id, JOB_TIMEOUT):
+        set_job_status(job_id, "queued")
+        return job_id, True
+
+    # Lost a race with another request for the same URL
+    release(user_id)
+    return start_job(url, user_id)
+
+
+def finish_job(url, user_id):
+    cache.delete(cache_key(url, ":job"))
+    release(user_id)
+
+
+# Written by the discover worker and read by the web process, so this relies on
+# the cache being shared between them
+def set_job_status(job_id, stage, **extra):
+    cache.set(f"feeds:job:{job_id}", {"stage": stage, **extra}, JOB_TIMEOUT)
+
+
+def job_status(job_id):
+    return cache.get(f"feeds:job:{job_id}")
+
+
+async def alookup(url):
+    feed_url = await cache.aget(cache_key(url))
+    if feed_url is None:
+        return False, None
+    return True, feed_url or None
+
+
+async def aremember(url, feed_url):
+    if feed_url:
+        await cache.aset(cache_key(url), feed_url, settings.FEEDS_DISCOVERY_TTL)
+    else:
+        await cache.aset(cache_key(url), NO_FEED, settings.FEEDS_DISCOVERY_NEGATIVE_TTL)
@@ -0,0 +1,61 @@
+import hashlib
+import io
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+# Favicons are stored once per unique image, named after a hash of their
+# content, with small pre-sized variants alongside the original
+STORE_PREFIX = "favicons/"
+
+SIZES = (32, 64)
+
+FORMATS = {"webp": "WEBP", "png": "PNG"}
+
+
+def is_stored(name):
+    return name is not None and name.startswith(STORE_PREFIX)
+
+
+def original_name(digest, ext):
+    return posixpath.join(STORE_PREFIX, digest[:2], f"{digest}.{ext}")
+
+
+def variant_name(name, size, fmt):
+    root, _ = posixpath.splitext(name)
+    return f"{root}-{size}.{fmt}"
+
+
+def make_variant(img, size, fmt):
+    variant = img.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    buf = io.BytesIO()
+    variant.save(buf, format=FORMATS[fmt])
+    return ContentFile(buf.getvalue())
+
+
+def store(favicon, storage=default_storage):
+    """
+    Saves a favicon to the content addressed store, returning its name. Images
+    already in the store are reused rather than saved again
+    """
+
+    favicon.seek(0)
+    content = favicon.read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    img = Image.open(io.BytesIO(content))
+    name = original_name(digest, img.format.lower())
+
+    if storage.exists(name):
+        return name
+
+    img = img.convert("RGBA")
+    for size in SIZES:
+        for fmt in FORMATS:
+            storage.save(variant_name(name, size, fmt), make_variant(img, size, fmt))
+
+    # Saved last, so the variants are guaranteed to exist alongside it
+    return storage.save(name, ContentFile(content))
@@ -0,0 +1,86 @@
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class HostRules:
+    """
+    Registry of known blog platforms, mapping a host suffix (e.g. substack.com)
+    to a function that builds the feed URL for a site on that platform.
+
+    Extra rules can be registered from settings.FEEDS_HOST_RULES, a dict of
+    host suffixes to dotted paths of rule functions
+    """
+
+    def __init__(self):
+        self.rules = {}
+        self.loaded_settings = False
+
+    def register(self, *suffixes):
+        def decorator(rule):
+            for suffix in suffixes:
+                self.rules[suffix.lower()] = rule
+            return rule
+
+        return decorator
+
+    def load_settings(self):
+        for suffix, path in getattr(settings, "FEEDS_HOST_RULES", {}).items():
+            self.rules[suffix.lower()] = import_string(path)
+        self.loaded_settings = True
+
+    def lookup(self, hostname):
+        """Finds the rule for the longest registered suffix of hostname"""
+
+        if not self.loaded_settings:
+            self.load_settings()
+
+        labels = (hostname or "").lower().split(".")
+        for i in range(len(labels)):
+            rule = self.rules.get(".".join(labels[i:]))
+            if rule is not None:
+                return rule
+
+    def translate(self, parsed):
+        rule = self.lookup(parsed.hostname)
+        if rule is not None:
+            return rule(parsed)
+
+
+rules = HostRules()
+
+
+@rules.register("wordpress.com", "bearblog.dev")
+def wordpress(parsed):
+    if not parsed.path.rstrip("/").endswith("/feed"):
+        return parsed._replace(path=f"{parsed.path.strip('/')}/feed/").geturl()
+    return parsed.geturl()
+
+
+@rules.register("substack.com")
+def substack(parsed):
+    if not parsed.path.endswith("/feed"):
+        return parsed._replace(path=f"{parsed.path}/feed").geturl()
+    return parsed.geturl()
+
+
+@rules.register("tumblr.com")
+def tumblr(parsed):
+    if parsed.path != "/rss":
+        return urljoin(parsed.geturl(), "rss")
+    return parsed.geturl()
+
+
+@rules.register("medium.com")
+def medium(parsed):
+    if not parsed.path.startswith("/feed"):
+        return parsed._replace(path=f"feed{parsed.path}").geturl()
+    return parsed.geturl()
+
+
+@rules.register("blogspot.com")
+def blogspot(parsed):
+    if parsed.path != "/feeds/posts/default":
+        return urljoin(parsed.geturl(), "feeds/posts/default")
+    return parsed.geturl()
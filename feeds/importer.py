@@ -0,0 +1,365 @@
+import itertools
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.text import slugify
+from lxml import etree
+
+import feeds.counters as counters
+import feeds.crawler as crawler
+import feeds.discovery as discovery
+import feeds.favicons as favicons
+import feeds.parser as parser
+import feeds.readstate as readstate
+import feeds.timeline as timeline
+import feeds.versions as versions
+from feeds.models import Category, Entry, Feed, ImportJob, ImportRecord, Subscription
+
+logger = logging.getLogger(__name__)
+
+# Number of crawled feeds written to the database together
+BATCH_SIZE = 50
+
+# Failed URLs are retried after RETRY_DELAY, doubling with every attempt up to
+# MAX_RETRY_DELAY
+RETRY_DELAY = timedelta(minutes=15)
+MAX_RETRY_DELAY = timedelta(days=1)
+
+# Number of URLs from an uploaded OPML file handed to each worker task
+CHUNK_SIZE = 25
+
+
+class ImportFailed(Exception):
+    """Raised when a URL being imported doesn't lead to a feed"""
+
+
+class Importer:
+    """
+    Collects crawled feeds for a user and writes them in batches, each batch
+    is a handful of bulk statements inside a single transaction
+    """
+
+    def __init__(self, user, batch_size=BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.pending = []
+        # Slug -> Category for the user, loaded on the first flush
+        self.categories = None
+
+    def add(self, source_url, resp, parsed, favicon, category_name):
+        """
+        Queues a crawled feed, returning a list of (source_url, feed_url) pairs
+        if that filled up a batch and it was written
+        """
+        self.pending.append((source_url, resp, parsed, favicon, category_name))
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def subscribe(self, source_url, feed_url, category_name):
+        """Queues a subscription to a feed that's already been ingested"""
+        return self.add(source_url, feed_url, None, None, category_name)
+
+    def prepare(self):
+        """Parses everything pending, outside of the transaction"""
+
+        prepared = []
+        for source_url, resp, parsed, favicon, category_name in self.pending:
+            if parsed is None:
+                # Subscribing to an existing feed, resp is the feed URL
+                prepared.append((source_url, resp, None, None, category_name))
+                continue
+
+            fields, entries = parser.parse_feed(resp, parsed, favicon)
+            if not fields:
+                prepared.append((source_url, None, None, None, category_name))
+                continue
+
+            if fields["favicon"] is not None:
+                fields["favicon"] = favicons.store(fields["favicon"])
+
+            prepared.append((source_url, fields["url"], fields, entries, category_name))
+        return prepared
+
+    def get_categories(self, names):
+        if self.categories is None:
+            self.categories = {
+                category.slug: category
+                for category in Category.objects.filter(user=self.user)
+            }
+
+        missing = {
+            slugify(name): name
+            for name in names
+            if name and slugify(name) not in self.categories
+        }
+        if missing:
+            # bulk_create skips Category.save, so the slug is set here
+            Category.objects.bulk_create(
+                [
+                    Category(name=name, slug=slug, user=self.user)
+                    for slug, name in missing.items()
+                ],
+                ignore_conflicts=True,
+            )
+            self.categories.update(
+                (category.slug, category)
+                for category in Category.objects.filter(
+                    user=self.user, slug__in=missing
+                )
+            )
+
+        return self.categories
+
+    def flush(self):
+        """Writes all the pending feeds, returning (source_url, feed_url) pairs"""
+
+        if not self.pending:
+            return []
+
+        prepared = self.prepare()
+        self.pending = []
+
+        new_feeds = {
+            feed_url: (fields, entries)
+            for _, feed_url, fields, entries, _ in prepared
+            if fields is not None
+        }
+        urls = {feed_url for _, feed_url, *_ in prepared if feed_url is not None}
+
+        with transaction.atomic():
+            # Each feed is inserted on its own so those that already exist,
+            # including any another worker has just added, are skipped and
+            # only the feeds created here have their entries added
+            created_urls = set()
+            for feed_url, (fields, _) in new_feeds.items():
+                try:
+                    with transaction.atomic():
+                        Feed.objects.bulk_create([Feed(**fields)])
+                except IntegrityError:
+                    continue
+                created_urls.add(feed_url)
+            feeds = Feed.objects.in_bulk(urls, field_name="url")
+
+            created = Entry.objects.bulk_create(
+                entry
+                for feed_url in created_urls
+                for entry in (
+                    parser.parse_feed_entry(entry, feeds[feed_url])
+                    for entry in new_feeds[feed_url][1]
+                )
+                if entry is not None
+            )
+            counters.count_entries(created)
+
+            categories = self.get_categories(
+                category_name for *_, category_name in prepared
+            )
+
+            Subscription.objects.bulk_create(
+                [
+                    Subscription(
+                        feed=feeds[feed_url],
+                        user=self.user,
+                        category=(
+                            categories[slugify(category_name)]
+                            if category_name
+                            else None
+                        ),
+                    )
+                    for _, feed_url, _, _, category_name in prepared
+                    if feed_url in feeds
+                ],
+                ignore_conflicts=True,
+            )
+
+            # bulk_create doesn't send the signals that normally do these
+            feed_ids = [feed.pk for feed in feeds.values()]
+            timeline.backfill(self.user.pk, feed_ids)
+            counters.refresh_subscriptions(self.user.pk, feed_ids)
+            readstate.refresh_unread(self.user.pk, feed_ids)
+
+        versions.bump(versions.SUBSCRIPTIONS, self.user.pk)
+
+        logger.info("Imported a batch of {} feeds".format(len(prepared)))
+
+        return [
+            (source_url, feed_url if feed_url in feeds else None)
+            for source_url, feed_url, *_ in prepared
+        ]
+
+
+def journal(user, feeds):
+    """
+    Records (url, category_name) pairs as pending imports for user, URLs that
+    are already in the journal keep their state
+    """
+    ImportRecord.objects.bulk_create(
+        [
+            ImportRecord(user=user, url=url, category=category_name)
+            for url, category_name in feeds
+        ],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
+
+
+def pending(user, retry_failed=False):
+    """Journalled imports that still need attempting"""
+
+    query = Q(state=ImportRecord.State.PENDING)
+    if retry_failed:
+        query |= Q(state=ImportRecord.State.FAILED, next_attempt_at__lte=timezone.now())
+    return ImportRecord.objects.filter(query, user=user).order_by("pk")
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def mark_failed(user, url, reason):
+    record = ImportRecord.objects.get(user=user, url=url)
+    record.state = ImportRecord.State.FAILED
+    record.reason = reason
+    record.attempts += 1
+    record.next_attempt_at = timezone.now() + retry_delay(record.attempts)
+    record.save()
+
+
+def mark_imported(user, results):
+    """Updates the journal from the (url, feed_url) pairs returned by flush"""
+
+    done = {url: feed_url for url, feed_url in results if feed_url is not None}
+
+    now = timezone.now()
+    records = list(ImportRecord.objects.filter(user=user, url__in=done))
+    for record in records:
+        record.updated_at = now
+        record.state = ImportRecord.State.DONE
+        record.feed_url = done[record.url]
+        record.reason = None
+        record.attempts += 1
+    ImportRecord.objects.bulk_update(
+        records, ["state", "feed_url", "reason", "attempts", "updated_at"]
+    )
+
+    for url, feed_url in results:
+        if feed_url is None:
+            mark_failed(user, url, "Couldn't parse feed")
+
+
+async def crawl_record(client, record):
+    """
+    Finds the feed for an ImportRecord, returning the (resp, parsed, favicon)
+    arguments for Importer.add, raises ImportFailed if there isn't one
+    """
+
+    found, feed_url = await discovery.alookup(record.url)
+    if found:
+        if feed_url is None:
+            raise ImportFailed("No feed found recently")
+        # Already ingested, so only needs subscribing to
+        return feed_url, None, None
+
+    resp, parsed, favicon = await crawler.Crawler(client, record.url).crawl()
+    if resp is None:
+        await discovery.aremember(record.url, None)
+        raise ImportFailed("No feed found")
+
+    return resp, parsed, favicon
+
+
+def parse_opml(f):
+    """
+    Yields (url, category_name) for each feed in an OPML file, reading it
+    incrementally so large files are never held in memory
+    """
+
+    categories = []
+    for event, element in etree.iterparse(
+        f,
+        events=("start", "end"),
+        tag="outline",
+        resolve_entities=False,
+        no_network=True,
+    ):
+        url = element.get("xmlUrl")
+        if event == "start":
+            if url is None:
+                categories.append(element.get("text") or element.get("title"))
+            continue
+
+        if url is None:
+            categories.pop()
+        else:
+            yield url, (categories[-1] if categories else None) or None
+
+        # Free up the outlines that have already been read
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def add_to_job(job, feeds):
+    """
+    Journals (url, category_name) pairs as part of job, returning the ids of
+    the records that need importing
+    """
+
+    journal(job.user, feeds)
+
+    with transaction.atomic():
+        # Records already claimed by a job that's still running are left to it
+        ids = list(
+            pending(job.user)
+            .select_for_update(of=("self",))
+            .filter(url__in=[url for url, _ in feeds])
+            .filter(Q(job=None) | Q(job__finished_at__isnull=False))
+            .values_list("pk", flat=True)
+        )
+        ImportRecord.objects.filter(pk__in=ids).update(job=job)
+        ImportJob.objects.filter(pk=job.pk).update(total=F("total") + len(ids))
+
+    return ids
+
+
+def release_records(job, record_ids):
+    """
+    Hands records a job couldn't queue back, so a later upload imports them
+    rather than leaving them to a job that never will
+    """
+
+    with transaction.atomic():
+        released = ImportRecord.objects.filter(pk__in=record_ids, job=job).update(
+            job=None
+        )
+        ImportJob.objects.filter(pk=job.pk).update(total=F("total") - released)
+
+
+def finish_job(job_id):
+    """Marks a job finished, once it's enqueued and every record is processed"""
+
+    ImportJob.objects.alias(processed=F("done") + F("failed")).filter(
+        pk=job_id, enqueued=True, finished_at=None, processed__gte=F("total")
+    ).update(finished_at=timezone.now())
+
+
+def close_job(job):
+    ImportJob.objects.filter(pk=job.pk).update(enqueued=True)
+    finish_job(job.pk)
+
+
+def advance_job(job_id, done, failed):
+    ImportJob.objects.filter(pk=job_id).update(
+        done=F("done") + done, failed=F("failed") + failed
+    )
+    finish_job(job_id)
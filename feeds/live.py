@@ -0,0 +1,85 @@
+"""
+Tells users' open tabs about new entries on their timelines as they're
+ingested. The ingest pipeline publishes to a Redis channel per user, and each
+open index page holds a server-sent events stream subscribed to its user's
+channel, fetching just the new entries when it hears about them
+"""
+
+import asyncio
+import json
+import logging
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds between comments sent down an idle stream, so proxies keep it open
+KEEPALIVE = 25
+
+# Seconds a stream is held open before the browser is asked to reconnect, as
+# the server isn't told when a client goes away mid stream
+LIFETIME = 300
+
+# Seconds the browser waits before reconnecting a closed stream
+RETRY = 5
+
+_client = None
+
+
+def channel(user_id):
+    return f"feeds:live:{user_id}"
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.FEEDS_LIVE_URL)
+    return _client
+
+
+def publish(counts):
+    """
+    Sends {user_id: number of new entries} to any open tabs, failures are only
+    logged as the entries are there the next time the timeline is loaded
+    """
+
+    if not counts:
+        return
+    try:
+        pipeline = get_client().pipeline(transaction=False)
+        for user_id, count in counts.items():
+            pipeline.publish(channel(user_id), json.dumps({"entries": count}))
+        pipeline.execute()
+    except redis.RedisError:
+        logger.warning("Couldn't publish new entries", exc_info=True)
+
+
+def event(name, data):
+    return f"event: {name}\ndata: {data}\n\n"
+
+
+async def stream(user_id):
+    """Yields a server-sent event for every message published to a user"""
+
+    client = aioredis.Redis.from_url(settings.FEEDS_LIVE_URL)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    loop = asyncio.get_running_loop()
+    try:
+        await pubsub.subscribe(channel(user_id))
+        yield f"retry: {RETRY * 1000}\n\n"
+
+        deadline = loop.time() + LIFETIME
+        while loop.time() < deadline:
+            message = await pubsub.get_message(timeout=KEEPALIVE)
+            if message is None:
+                yield ": keepalive\n\n"
+            else:
+                yield event("entries", message["data"].decode())
+    except redis.RedisError:
+        logger.warning("Live updates stream failed", exc_info=True)
+    finally:
+        # close() rather than aclose(), which redis-py only has from 5.0.1
+        await pubsub.close()
+        await client.close()
@@ -0,0 +1,33 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+import feeds.favicons as favicons
+from feeds.models import Feed
+
+
+class Command(BaseCommand):
+    help = "Moves favicons saved per feed into the content addressed store"
+
+    def handle(self, *args, **options):
+        legacy = (
+            Feed.objects.exclude(favicon="")
+            .exclude(favicon__isnull=True)
+            .exclude(favicon__startswith=favicons.STORE_PREFIX)
+        )
+
+        for feed in legacy.iterator():
+            old_name = feed.favicon.name
+
+            try:
+                with feed.favicon.open("rb") as f:
+                    name = favicons.store(f)
+            except (OSError, UnidentifiedImageError) as err:
+                print(f"failed to store {old_name}: {err}")
+                continue
+
+            Feed.objects.filter(pk=feed.pk).update(favicon=name)
+            print(old_name, "->", name)
+
+            if not Feed.objects.filter(favicon=old_name).exists():
+                default_storage.delete(old_name)
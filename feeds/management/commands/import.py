@@ -9,44 +9,75 @@ from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
 from rich.progress import Progress
 
-import feeds.crawler as crawler
-from feeds.models import Category, Feed, Subscription
+import feeds.discovery as discovery
+from feeds.importer import (
+    BATCH_SIZE,
+    Importer,
+    crawl_record,
+    journal,
+    mark_failed,
+    mark_imported,
+    pending,
+)
+from feeds.models import Feed
 
 user = User.objects.first()
 
 
-def ingest(resp, parsed, favicon, category_name):
-    feed = crawler.ingest_feed(resp, parsed, favicon)
-    if category_name:
-        category, _ = Category.objects.get_or_create(name=category_name, user=user)
-    else:
-        category = None
-    Subscription.objects.create(feed=feed, user=user, category=category)
+async def remember(results):
+    for source_url, feed_url in results:
+        await discovery.aremember(source_url, feed_url)
+    await sync_to_async(mark_imported)(user, results)
 
 
-sync_ingest = sync_to_async(ingest)
+async def fail(url, reason):
+    print("Failed:", url, "({})".format(reason))
+    await sync_to_async(mark_failed)(user, url, reason)
 
 
-async def import_feed(client, feed):
-    print("Fetching:", feed["url"])
-    resp, parsed_feed, favicon = await crawler.Crawler(client, feed["url"]).crawl()
-    print("Got:", resp.url, resp.status_code)
-    await sync_ingest(resp, parsed_feed, favicon, feed["categories"][0][0])
+async def import_feed(client, importer, record):
+    print("Fetching:", record.url)
+    try:
+        resp, parsed_feed, favicon = await crawl_record(client, record)
+    except Exception as err:
+        await fail(record.url, str(err) or type(err).__name__)
+        return
 
+    print("Got:", record.url)
+    await remember(
+        await sync_to_async(importer.add)(
+            record.url, resp, parsed_feed, favicon, record.category
+        )
+    )
+
+
+async def main(infile, workers, batch_size, retry_failed):
+
+    if infile is not None:
+        parsed = listparser.parse(infile.read())
 
-async def main(infile, workers):
+        subscribed = set()
+        async for url in Feed.objects.values_list("url", flat=True):
+            subscribed.add(discovery.normalize_url(url))
 
-    parsed = listparser.parse(infile.read())
+        feeds = []
+        for feed in parsed["feeds"]:
+            # Also skips any duplicate entries in the OPML file
+            normalized = discovery.normalize_url(feed["url"])
+            if normalized not in subscribed:
+                subscribed.add(normalized)
+                feeds.append((feed["url"], feed["categories"][0][0] or None))
 
-    subscribed = set()
-    async for url in Feed.objects.values_list("url", flat=True):
-        subscribed.add(url)
+        # URLs from a previous run keep their state, so this resumes it
+        await sync_to_async(journal)(user, feeds)
 
     queue = asyncio.Queue()
 
-    for feed in parsed["feeds"]:
-        if feed["url"] not in subscribed:
-            queue.put_nowait(feed)
+    async for record in pending(user, retry_failed):
+        queue.put_nowait(record)
+
+    # Crawled feeds are written in batches as they come in
+    importer = Importer(user, batch_size)
 
     async with httpx.AsyncClient(follow_redirects=True, timeout=60) as client:
 
@@ -57,10 +88,9 @@ async def main(infile, workers):
             async def worker():
                 while True:
                     # Get a "work item" out of the queue.
-                    feed = await queue.get()
+                    record = await queue.get()
 
-                    # Sleep for the "sleep_for" seconds.
-                    await import_feed(client, feed)
+                    await import_feed(client, importer, record)
 
                     progress.advance(import_task)
 
@@ -73,23 +103,45 @@ async def main(infile, workers):
                 task = asyncio.create_task(worker())
                 tasks.append(task)
 
-            # Wait until the queue is fully processed.
-            await queue.join()
+            try:
+                # Wait until the queue is fully processed.
+                await queue.join()
+            finally:
+                # Cancel our worker tasks.
+                for task in tasks:
+                    task.cancel()
 
-            # Cancel our worker tasks.
-            for task in tasks:
-                task.cancel()
+                # Wait until all worker tasks are cancelled.
+                await asyncio.gather(*tasks, return_exceptions=True)
 
-            # Wait until all worker tasks are cancelled.
-            await asyncio.gather(*tasks, return_exceptions=True)
+                # Write whatever is left over from the last partial batch, even
+                # when interrupted, so it doesn't need crawling again
+                await remember(await sync_to_async(importer.flush)())
 
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
-            "infile", nargs="?", type=argparse.FileType("r"), default=sys.stdin
+            "infile", nargs="?", type=argparse.FileType("r"), default=None
         )
         parser.add_argument("--workers", nargs="?", type=int, default=100)
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also retry failed URLs whose backoff has expired",
+        )
 
     def handle(self, *args, **options):
-        asyncio.run(main(options["infile"], options["workers"]))
+        infile = options["infile"]
+        if infile is None and not options["retry_failed"]:
+            infile = sys.stdin
+
+        asyncio.run(
+            main(
+                infile,
+                options["workers"],
+                options["batch_size"],
+                options["retry_failed"],
+            )
+        )
@@ -7,12 +7,16 @@ import dateutil.parser
 import httpx
 from asgiref.sync import sync_to_async
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.db.models import F
 from django.utils import timezone
 from django.utils.http import http_date
 from rich.progress import Progress
 
+import feeds.clients as clients
+import feeds.counters as counters
 import feeds.parser as parser
+import feeds.timeline as timeline
 from feeds.models import Entry, Feed
 
 USER_AGENT = "feedreader/1 +https://github.com/Jackevansevo/feedreader/"
@@ -24,7 +28,14 @@ async def fetch_feed(client, url, etag=None, last_modified=None):
         headers["If-None-Match"] = etag
     if last_modified is not None:
         headers["If-Modified-Since"] = http_date(int(last_modified.strftime("%s")))
-    return await client.get(url, headers=headers)
+    return await client.get(url, headers=headers, follow_redirects=True, timeout=60)
+
+
+@transaction.atomic
+def ingest_entries(entries):
+    Entry.objects.bulk_create(entries)
+    counters.count_entries(entries)
+    timeline.fan_out(entries)
 
 
 async def main(workers, force: bool = False, filter: Optional[str] = None):
@@ -49,107 +60,113 @@ async def main(workers, force: bool = False, filter: Optional[str] = None):
     async for feed in feed_query:
         queue.put_nowait(feed)
 
-    async with httpx.AsyncClient(follow_redirects=True, timeout=60) as client:
-        with Progress() as progress:
+    client = clients.get_client()
+
+    with Progress() as progress:
+
+        fetch_task = progress.add_task("Fetching...", total=queue.qsize())
 
-            fetch_task = progress.add_task("Fetching...", total=queue.qsize())
+        async def worker(queue, client):
+            while True:
+                # Get a "work item" out of the queue.
+                feed = await queue.get()
 
-            async def worker(queue, client):
-                while True:
-                    # Get a "work item" out of the queue.
-                    feed = await queue.get()
+                # Sleep for the "sleep_for" seconds.
+                try:
+                    resp = await fetch_feed(client, **feed)
+                except httpx.ConnectError as err:
+                    print(f"failed to fetch {feed}: {err}")
+                else:
+                    results.put_nowait(resp)
+                finally:
+                    # Notify the queue that the "work item" has been processed.
+                    queue.task_done()
 
-                    # Sleep for the "sleep_for" seconds.
-                    try:
-                        resp = await fetch_feed(client, **feed)
-                    except httpx.ConnectError as err:
-                        print(f"failed to fetch {feed}: {err}")
-                    else:
-                        results.put_nowait(resp)
-                    finally:
-                        # Notify the queue that the "work item" has been processed.
-                        queue.task_done()
+                    progress.advance(fetch_task)
 
-                        progress.advance(fetch_task)
+        # Create three worker tasks to process the queue concurrently.
+        tasks = []
+        for i in range(workers):
+            task = asyncio.create_task(worker(queue, client))
+            tasks.append(task)
 
-            # Create three worker tasks to process the queue concurrently.
-            tasks = []
-            for i in range(workers):
-                task = asyncio.create_task(worker(queue, client))
-                tasks.append(task)
+        # Wait until the queue is fully processed.
+        await queue.join()
 
-            # Wait until the queue is fully processed.
-            await queue.join()
+        # Cancel our worker tasks.
+        for task in tasks:
+            task.cancel()
 
-            # Cancel our worker tasks.
-            for task in tasks:
-                task.cancel()
+        # Wait until all worker tasks are cancelled.
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-            # Wait until all worker tasks are cancelled.
-            await asyncio.gather(*tasks, return_exceptions=True)
+        async def process_results():
+            while True:
+                result = await results.get()
 
-            async def process_results():
-                while True:
-                    result = await results.get()
+                print(f"Got response from: {result.url}")
 
-                    print(f"Got response from: {result.url}")
+                lookup_url = result.url
+                if result.history:
+                    lookup_url = result.history[0].url
 
-                    lookup_url = result.url
-                    if result.history:
-                        lookup_url = result.history[0].url
+                try:
+                    feed = await Feed.objects.aget(url=lookup_url)
+                except Feed.DoesNotExist:
+                    return
 
-                    try:
-                        feed = await Feed.objects.aget(url=lookup_url)
-                    except Feed.DoesNotExist:
-                        return
+                update_fields = ["last_checked"]
+                feed.last_checked = timezone.now()
 
-                    update_fields = ["last_checked"]
-                    feed.last_checked = timezone.now()
+                # If we were redirected, update to the new URL
+                if result.history:
+                    print(f"{feed.url} redirected -> {result.url}")
+                    feed.url = str(result.url)
+                    update_fields.append("url")
 
-                    # If we were redirected, update to the new URL
-                    if result.history:
-                        print(f"{feed.url} redirected -> {result.url}")
-                        feed.url = str(result.url)
-                        update_fields.append("url")
+                if result.status_code == 200:
 
-                    if result.status_code == 200:
+                    parsed = parser.parse(io.BytesIO(result.content))
+                    existing_entries = set()
 
-                        parsed = parser.parse(io.BytesIO(result.content))
-                        existing_entries = set()
+                    async for link in Entry.objects.filter(
+                        feed__url=result.url
+                    ).values_list("link", flat=True):
+                        existing_entries.add(link)
 
-                        async for link in Entry.objects.filter(
-                            feed__url=result.url
-                        ).values_list("link", flat=True):
-                            existing_entries.add(link)
+                    new_entries = []
+                    for entry in parsed["entries"]:
+                        link = entry.get("link")
+                        if (
+                            link is not None
+                            and urljoin(feed.link, link) not in existing_entries
+                        ):
+                            entry = parser.parse_feed_entry(entry, feed)
+                            if entry is not None:
+                                new_entries.append(entry)
 
-                        for entry in parsed["entries"]:
-                            link = entry.get("link")
-                            if (
-                                link is not None
-                                and urljoin(feed.link, link) not in existing_entries
-                            ):
-                                entry = parser.parse_feed_entry(entry, feed)
-                                await sync_to_async(entry.save)()
+                    if new_entries:
+                        await sync_to_async(ingest_entries)(new_entries)
 
-                        etag = result.headers.get("etag")
-                        if etag is not None:
-                            update_fields.append("etag")
-                            feed.etag = etag
+                    etag = result.headers.get("etag")
+                    if etag is not None:
+                        update_fields.append("etag")
+                        feed.etag = etag
 
-                        last_modified = result.headers.get("last-modified")
-                        if last_modified is not None:
-                            update_fields.append("last_modified")
-                            feed.last_modified = dateutil.parser.parse(last_modified)
+                    last_modified = result.headers.get("last-modified")
+                    if last_modified is not None:
+                        update_fields.append("last_modified")
+                        feed.last_modified = dateutil.parser.parse(last_modified)
 
-                    await sync_to_async(feed.save)(update_fields=update_fields)
+                await sync_to_async(feed.save)(update_fields=update_fields)
 
-                    results.task_done()
+                results.task_done()
 
-            process_task = asyncio.create_task(process_results())
+        process_task = asyncio.create_task(process_results())
 
-            await results.join()
+        await results.join()
 
-            process_task.cancel()
+        process_task.cancel()
 
 
 class Command(BaseCommand):
@@ -163,7 +180,7 @@ class Command(BaseCommand):
         parser.add_argument("--force", action="store_true")
 
     def handle(self, *args, **options):
-        asyncio.run(
+        clients.run(
             main(
                 options["workers"],
                 options["force"],
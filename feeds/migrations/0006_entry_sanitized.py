@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feeds", "0005_alter_feed_ttl"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="entry",
+            name="sanitized",
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def populate_timeline(apps, schema_editor):
+    Entry = apps.get_model("feeds", "Entry")
+    Subscription = apps.get_model("feeds", "Subscription")
+    TimelineEntry = apps.get_model("feeds", "TimelineEntry")
+
+    for user_id, feed_id in Subscription.objects.values_list("user_id", "feed_id"):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id, feed_id=feed_id, entry_id=pk, published=published
+                )
+                for pk, published in Entry.objects.filter(feed_id=feed_id).values_list(
+                    "pk", "published"
+                )
+            ],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feeds", "0009_timelineentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_timeline, migrations.RunPython.noop),
+    ]
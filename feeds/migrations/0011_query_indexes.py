@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feeds", "0010_populate_timeline"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="feed",
+            name="last_checked",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(
+                fields=["feed", "-published", "-id"], name="feeds_entry_feed_pub_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(fields=["user", "feed"], name="feeds_sub_user_feed_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["user", "category"], name="feeds_sub_user_category_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,125 @@
+from django.db import migrations
+
+# Full text indexes over entries and feeds. SQLite uses FTS5 tables kept in
+# sync with triggers, Postgres uses generated tsvector columns with GIN indexes.
+# On SQLite, later migrations that rebuild feeds_entry or feeds_feed (rather
+# than altering them in place) drop the triggers, they're recreated after
+# migrating by feeds.search.restore_triggers
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE feeds_entry_fts USING fts5(
+        title, summary, content,
+        content='feeds_entry', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER feeds_entry_fts_insert AFTER INSERT ON feeds_entry BEGIN
+        INSERT INTO feeds_entry_fts(rowid, title, summary, content)
+        VALUES (new.id, new.title, new.summary, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER feeds_entry_fts_delete AFTER DELETE ON feeds_entry BEGIN
+        INSERT INTO feeds_entry_fts(feeds_entry_fts, rowid, title, summary, content)
+        VALUES ('delete', old.id, old.title, old.summary, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER feeds_entry_fts_update AFTER UPDATE OF title, summary, content
+    ON feeds_entry BEGIN
+        INSERT INTO feeds_entry_fts(feeds_entry_fts, rowid, title, summary, content)
+        VALUES ('delete', old.id, old.title, old.summary, old.content);
+        INSERT INTO feeds_entry_fts(rowid, title, summary, content)
+        VALUES (new.id, new.title, new.summary, new.content);
+    END
+    """,
+    "INSERT INTO feeds_entry_fts(feeds_entry_fts) VALUES ('rebuild')",
+    """
+    CREATE VIRTUAL TABLE feeds_feed_fts USING fts5(
+        title, subtitle,
+        content='feeds_feed', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER feeds_feed_fts_insert AFTER INSERT ON feeds_feed BEGIN
+        INSERT INTO feeds_feed_fts(rowid, title, subtitle)
+        VALUES (new.id, new.title, new.subtitle);
+    END
+    """,
+    """
+    CREATE TRIGGER feeds_feed_fts_delete AFTER DELETE ON feeds_feed BEGIN
+        INSERT INTO feeds_feed_fts(feeds_feed_fts, rowid, title, subtitle)
+        VALUES ('delete', old.id, old.title, old.subtitle);
+    END
+    """,
+    """
+    CREATE TRIGGER feeds_feed_fts_update AFTER UPDATE OF title, subtitle
+    ON feeds_feed BEGIN
+        INSERT INTO feeds_feed_fts(feeds_feed_fts, rowid, title, subtitle)
+        VALUES ('delete', old.id, old.title, old.subtitle);
+        INSERT INTO feeds_feed_fts(rowid, title, subtitle)
+        VALUES (new.id, new.title, new.subtitle);
+    END
+    """,
+    "INSERT INTO feeds_feed_fts(feeds_feed_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER feeds_entry_fts_insert",
+    "DROP TRIGGER feeds_entry_fts_delete",
+    "DROP TRIGGER feeds_entry_fts_update",
+    "DROP TABLE feeds_entry_fts",
+    "DROP TRIGGER feeds_feed_fts_insert",
+    "DROP TRIGGER feeds_feed_fts_delete",
+    "DROP TRIGGER feeds_feed_fts_update",
+    "DROP TABLE feeds_feed_fts",
+]
+
+POSTGRES_FORWARDS = [
+    """
+    ALTER TABLE feeds_entry ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(summary, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(content, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX feeds_entry_search_idx ON feeds_entry USING GIN (search_vector)",
+    """
+    ALTER TABLE feeds_feed ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(subtitle, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX feeds_feed_search_idx ON feeds_feed USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARDS = [
+    "ALTER TABLE feeds_entry DROP COLUMN search_vector",
+    "ALTER TABLE feeds_feed DROP COLUMN search_vector",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feeds", "0011_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARDS, "postgresql": POSTGRES_FORWARDS}),
+            run({"sqlite": SQLITE_BACKWARDS, "postgresql": POSTGRES_BACKWARDS}),
+        ),
+    ]
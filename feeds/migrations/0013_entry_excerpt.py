@@ -0,0 +1,70 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:19
+
+import math
+
+from bs4 import BeautifulSoup
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+# The new columns are nullable without defaults so SQLite adds them in place,
+# rebuilding feeds_entry would drop the full text search triggers from 0012
+
+# Copied from feeds.parser as of this migration
+EXCERPT_WORDS = 35
+READING_SPEED = 200
+
+
+def html_text(html):
+    soup = BeautifulSoup(html, features="html.parser")
+    for tag in soup(["script", "style"]):
+        tag.decompose()
+    return soup.get_text(" ")
+
+
+def summarize_entry(entry):
+    words = html_text(entry.content).split() if entry.content else []
+    entry.word_count = len(words)
+    entry.reading_time = math.ceil(len(words) / READING_SPEED)
+
+    if entry.summary:
+        words = html_text(entry.summary).split()
+    entry.excerpt = Truncator(" ".join(words)).words(EXCERPT_WORDS) or None
+    return entry
+
+
+def summarize_entries(apps, schema_editor):
+    Entry = apps.get_model("feeds", "Entry")
+
+    batch = []
+    for entry in Entry.objects.only("content", "summary").iterator(chunk_size=500):
+        batch.append(summarize_entry(entry))
+        if len(batch) == 500:
+            Entry.objects.bulk_update(batch, ["excerpt", "word_count", "reading_time"])
+            batch = []
+    Entry.objects.bulk_update(batch, ["excerpt", "word_count", "reading_time"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feeds", "0012_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="entry",
+            name="excerpt",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="entry",
+            name="reading_time",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="entry",
+            name="word_count",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunPython(summarize_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:24
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Copied from feeds.readstate as of this migration
+def decode(data):
+    ids = []
+    pk = delta = shift = 0
+    for byte in data:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            pk += delta
+            ids.append(pk)
+            delta = shift = 0
+    return ids
+
+
+def grouped_counts(queryset, field):
+    return dict(queryset.order_by().values_list(field).annotate(Count("pk")))
+
+
+def count_everything(apps, schema_editor):
+    """The counters as feeds.counters.reconcile and reconcile_unread set them"""
+
+    Counter = apps.get_model("feeds", "Counter")
+    Entry = apps.get_model("feeds", "Entry")
+    ReadState = apps.get_model("feeds", "ReadState")
+    Subscription = apps.get_model("feeds", "Subscription")
+
+    entries = grouped_counts(Entry.objects.all(), "feed_id")
+    values = {f"entries:{pk}": count for pk, count in entries.items()}
+    values.update(
+        (f"subscribers:{pk}", count)
+        for pk, count in grouped_counts(Subscription.objects.all(), "feed_id").items()
+    )
+    values.update(
+        (f"subscriptions:{pk}", count)
+        for pk, count in grouped_counts(
+            Subscription.objects.filter(category__isnull=False), "category_id"
+        ).items()
+    )
+
+    states = {
+        (user_id, feed_id): (read_up_to, read_ids)
+        for user_id, feed_id, read_up_to, read_ids in ReadState.objects.values_list(
+            "user_id", "feed_id", "read_up_to", "read_ids"
+        )
+    }
+    for user_id, feed_id in Subscription.objects.values_list("user_id", "feed_id"):
+        read_up_to, read_ids = states.get((user_id, feed_id), (0, b""))
+        if read_up_to:
+            above = Entry.objects.filter(feed_id=feed_id, pk__gt=read_up_to).count()
+        else:
+            above = entries.get(feed_id, 0)
+        values[f"unread:{user_id}:{feed_id}"] = above - len(decode(read_ids))
+
+    Counter.objects.bulk_create(
+        [Counter(name=name, value=value) for name, value in values.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feeds", "0014_readstate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Counter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=200, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_everything, migrations.RunPython.noop),
+    ]
@@ -44,7 +44,7 @@ class Feed(models.Model):
     url = models.URLField(unique=True)
     etag = models.CharField(max_length=200, blank=True, null=True)
     last_modified = models.DateTimeField(null=True)
-    last_checked = models.DateTimeField(auto_now=True)
+    last_checked = models.DateTimeField(auto_now=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     favicon = models.ImageField(blank=True, null=True)
     ttl = models.DurationField(default=timedelta(hours=1))
@@ -83,6 +83,12 @@ class Subscription(models.Model):
 
     class Meta:
         unique_together = [["feed", "user"]]
+        indexes = [
+            models.Index(fields=["user", "feed"], name="feeds_sub_user_feed_idx"),
+            models.Index(
+                fields=["user", "category"], name="feeds_sub_user_category_idx"
+            ),
+        ]
 
 
 class Entry(models.Model):
@@ -101,6 +107,13 @@ class Entry(models.Model):
     guid = models.CharField(max_length=400, blank=True, null=True)
     author = models.CharField(max_length=400, blank=True, null=True)
     thumbnail = models.URLField(blank=True, null=True, max_length=500)
+    # False while content/summary still hold the raw HTML from the feed
+    sanitized = models.BooleanField(default=True)
+    # Precomputed at ingest so list views never need to load content/summary
+    excerpt = models.TextField(blank=True, null=True)
+    word_count = models.PositiveIntegerField(null=True)
+    # In minutes
+    reading_time = models.PositiveIntegerField(null=True)
 
     def get_absolute_url(self):
         return reverse(
@@ -118,3 +131,114 @@ class Entry(models.Model):
     class Meta:
         verbose_name_plural = "entries"
         ordering = ["-published", "title"]
+        indexes = [
+            models.Index(
+                fields=["feed", "-published", "-id"], name="feeds_entry_feed_pub_idx"
+            )
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    An entry on a user's home page, copied here for each subscriber when it's
+    ingested so the page doesn't need to join through their subscriptions
+    """
+
+    user: models.ForeignKey = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE
+    )
+    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name="+")
+    entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name="timeline")
+    published = models.DateTimeField(null=True)
+
+    class Meta:
+        unique_together = [["user", "entry"]]
+        indexes = [
+            # Covers paging through a user's timeline newest first
+            models.Index(
+                fields=["user", "-published", "-entry"], name="feeds_timeline_idx"
+            ),
+            models.Index(fields=["user", "feed"], name="feeds_timeline_feed_idx"),
+        ]
+
+
+class ReadState(models.Model):
+    """
+    Which of a feed's entries a user has read, every entry up to read_up_to
+    and the ones above it listed in read_ids, see feeds.readstate
+    """
+
+    user: models.ForeignKey = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE
+    )
+    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name="+")
+    read_up_to = models.BigIntegerField(default=0)
+    read_ids = models.BinaryField(default=b"")
+
+    class Meta:
+        unique_together = [["user", "feed"]]
+
+
+class Counter(models.Model):
+    """A count kept up to date as things change, see feeds.counters"""
+
+    name = models.CharField(max_length=200, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class ImportJob(models.Model):
+    """An OPML file uploaded through the site, imported in chunks by workers"""
+
+    user: models.ForeignKey = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE
+    )
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # Set once every chunk of the file has been handed to a worker
+    enqueued = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def get_absolute_url(self):
+        return reverse("feeds:import-detail", kwargs={"pk": self.pk})
+
+
+class ImportRecord(models.Model):
+    """The import state of a single URL from a user's OPML file"""
+
+    class State(models.TextChoices):
+        PENDING = "pending"
+        DONE = "done"
+        FAILED = "failed"
+
+    user: models.ForeignKey = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE
+    )
+    url = models.URLField(max_length=1000)
+    category = models.CharField(max_length=200, blank=True, null=True)
+    job = models.ForeignKey(
+        ImportJob,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="records",
+    )
+    state = models.CharField(
+        max_length=10, choices=State.choices, default=State.PENDING
+    )
+    reason = models.TextField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True)
+    feed_url = models.URLField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [["user", "url"]]
+        indexes = [models.Index(fields=["user", "state", "next_attempt_at"])]
+
+    def __str__(self):
+        return self.url
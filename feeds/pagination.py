@@ -0,0 +1,130 @@
+from datetime import datetime
+from operator import attrgetter
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+SALT = "feeds.pagination"
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class CursorPaginator:
+    """
+    Pages through a queryset newest first by (published, pk), seeking past the
+    last row seen rather than counting and offsetting, so every page costs the
+    same. Cursors are signed so they're opaque to clients.
+
+    published and pk are the lookups ordered on, key returns their values for
+    one of the objects returned
+    """
+
+    def __init__(
+        self,
+        queryset,
+        per_page,
+        published="published",
+        pk="pk",
+        key=attrgetter("published", "pk"),
+    ):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.published = published
+        self.pk = pk
+        self.key = key
+
+    def encode(self, obj, direction):
+        published, pk = self.key(obj)
+        if published is not None:
+            published = published.isoformat()
+        return signing.dumps([direction, published, pk], salt=SALT)
+
+    def decode(self, cursor):
+        try:
+            direction, published, pk = signing.loads(cursor, salt=SALT)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        if published is not None:
+            published = datetime.fromisoformat(published)
+        return direction, published, pk
+
+    def seek(self, op, published, pk):
+        """
+        Filters rows whose (published, pk) is less than ("lt") or greater than
+        ("gt") the given key, with NULLs placed where the database sorts them
+        """
+
+        isnull = f"{self.published}__isnull"
+        nulls_largest = connections[self.queryset.db].features.nulls_order_largest
+        nulls_beyond = nulls_largest if op == "gt" else not nulls_largest
+
+        if published is None:
+            query = Q(**{isnull: True, f"{self.pk}__{op}": pk})
+            if not nulls_beyond:
+                query |= Q(**{isnull: False})
+        else:
+            query = Q(**{f"{self.published}__{op}": published}) | Q(
+                **{self.published: published, f"{self.pk}__{op}": pk}
+            )
+            if nulls_beyond:
+                query |= Q(**{isnull: True})
+        return query
+
+    def get_page(self, cursor=None):
+        decoded = self.decode(cursor) if cursor else None
+
+        if decoded is not None and decoded[0] == "prev":
+            _, published, pk = decoded
+            rows = list(
+                self.queryset.filter(self.seek("gt", published, pk)).order_by(
+                    self.published, self.pk
+                )[: self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            object_list = rows[: self.per_page][::-1]
+            has_next = True
+        else:
+            queryset = self.queryset
+            if decoded is not None:
+                _, published, pk = decoded
+                queryset = queryset.filter(self.seek("lt", published, pk))
+            rows = list(
+                queryset.order_by(f"-{self.published}", f"-{self.pk}")[
+                    : self.per_page + 1
+                ]
+            )
+            has_next = len(rows) > self.per_page
+            object_list = rows[: self.per_page]
+            has_previous = decoded is not None
+
+        if not object_list:
+            return CursorPage([], None, None)
+
+        return CursorPage(
+            object_list,
+            self.encode(object_list[-1], "next") if has_next else None,
+            self.encode(object_list[0], "prev") if has_previous else None,
+        )
@@ -1,4 +1,5 @@
 import io
+import math
 import posixpath
 import re
 from datetime import datetime, timedelta
@@ -9,10 +10,11 @@ import bleach
 import dateutil.parser
 import httpx
 from bs4 import BeautifulSoup
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
 from django.utils import timezone
-from django.utils.text import slugify
+from django.utils.text import Truncator, slugify
 from lxml import etree
 from unidecode import unidecode
 
@@ -21,6 +23,12 @@ from feeds.models import Entry
 
 XML_PARSER = etree.XMLParser(recover=True, remove_comments=True)
 
+# Length of the excerpt shown on cards, in words
+EXCERPT_WORDS = 35
+
+# Words per minute, for reading times
+READING_SPEED = 200
+
 
 BLEACH_ALLOWED_TAGS = [
     "a",
@@ -393,6 +401,142 @@ def parse_feed(resp, parsed, favicon):
     return feed, parsed["entries"]
 
 
+def clean_summary(summary):
+    # Strip out any images
+    soup = BeautifulSoup(summary, features="html.parser")
+    for img in soup.findAll("img"):
+        img.extract()
+
+    # Strip out any continue reading links
+    for a_tag in soup.findAll("a"):
+        if "continue reading" in a_tag.text.lower():
+            a_tag.extract()
+
+    return str(soup)
+
+
+def clean_content(content, feed):
+    """Sanitize entry HTML, returning the cleaned content and a thumbnail"""
+
+    feed_parsed = urlparse(feed.url)
+
+    thumbnail = None
+
+    content = bleach.clean(
+        content,
+        attributes=["href", "title", "src"],
+        tags=BLEACH_ALLOWED_TAGS,
+        strip=True,
+    )
+    soup = BeautifulSoup(content, features="html.parser")
+
+    for img in soup.findAll("img"):
+        del img["width"]
+        del img["height"]
+        del img["class"]
+
+        src = img.get("src")
+        parsed_src = urlparse(src)
+
+        # Some feeds still use relative URLs, we can attempt to fix this
+        if parsed_src.netloc == "":
+            img["src"] = parsed_src._replace(
+                netloc=feed_parsed.netloc, scheme=feed_parsed.scheme
+            ).geturl()
+
+        img["class"] = "rounded mx-auto d-block"
+
+        # TODO use the biggest image as the thumbnail
+        if thumbnail is None:
+            src = img.get("src")
+            fname, ext = splitext(urlparse(src).path)
+            if ext != ".gif" and ext != ".svg":
+                if src is not None and len(src) < 500:
+                    # Check if dimensions are included in the image
+                    match = re.search(r"\d+x\d+", fname)
+                    if match:
+                        x, y = list(map(int, match.group().split("x")))
+                        if x < 100 or y < 100:
+                            continue
+                    thumbnail = src
+
+    return str(soup), thumbnail
+
+
+def sanitize_entry(entry):
+    """Run the sanitize/rewrite pipeline over an entry stored with raw content"""
+
+    if entry.summary is not None:
+        entry.summary = clean_summary(entry.summary)
+
+    if entry.content is not None:
+        entry.content, thumbnail = clean_content(entry.content, entry.feed)
+        if entry.thumbnail is None:
+            entry.thumbnail = thumbnail
+
+    entry.sanitized = True
+    return summarize_entry(entry)
+
+
+def sanitize_entries(entries):
+    """Sanitize any entries that were stored raw, caching the result in the row"""
+
+    pending = [entry for entry in entries if not entry.sanitized]
+    if not pending:
+        return entries
+
+    # List views defer the HTML, so it's loaded here for just these entries
+    deferred = [
+        entry
+        for entry in pending
+        if {"content", "summary"} & entry.get_deferred_fields()
+    ]
+    if deferred:
+        loaded = Entry.objects.only("content", "summary").in_bulk(
+            [entry.pk for entry in deferred]
+        )
+        for entry in deferred:
+            entry.content = loaded[entry.pk].content
+            entry.summary = loaded[entry.pk].summary
+
+    Entry.objects.bulk_update(
+        [sanitize_entry(entry) for entry in pending],
+        [
+            "content",
+            "summary",
+            "thumbnail",
+            "sanitized",
+            "excerpt",
+            "word_count",
+            "reading_time",
+        ],
+    )
+
+    return entries
+
+
+def html_text(html):
+    """The readable text in some HTML, without scripts or styles"""
+
+    soup = BeautifulSoup(html, features="html.parser")
+    for tag in soup(["script", "style"]):
+        tag.decompose()
+    return soup.get_text(" ")
+
+
+def summarize_entry(entry):
+    """Fills in the excerpt, word count and reading time shown in list views"""
+
+    words = html_text(entry.content).split() if entry.content else []
+    entry.word_count = len(words)
+    entry.reading_time = math.ceil(len(words) / READING_SPEED)
+
+    if entry.summary:
+        words = html_text(entry.summary).split()
+    entry.excerpt = Truncator(" ".join(words)).words(EXCERPT_WORDS) or None
+    return entry
+
+
 def parse_feed_entry(entry, feed):
 
     # TODO update parse to parse descriptions and publish dates properly
@@ -406,18 +550,12 @@ def parse_feed_entry(entry, feed):
     elif summary == content:
         summary = None
 
-    if summary is not None:
-        # Strip out any images
-        soup = BeautifulSoup(summary, features="html.parser")
-        for img in soup.findAll("img"):
-            img.extract()
-
-        # Strip out any continue reading links
-        for a_tag in soup.findAll("a"):
-            if "continue reading" in a_tag.text.lower():
-                a_tag.extract()
+    # When sanitizing lazily the raw HTML is stored as is and cleaned up the
+    # first time the entry is rendered, see sanitize_entries
+    sanitized = not settings.FEEDS_LAZY_SANITIZE
 
-        summary = str(soup)
+    if summary is not None and sanitized:
+        summary = clean_summary(summary)
 
     title = entry.get("title")
 
@@ -433,50 +571,10 @@ def parse_feed_entry(entry, feed):
         if path:
             slug = posixpath.basename(path)
 
-    feed_parsed = urlparse(feed.url)
-
     thumbnail = None
 
-    if content is not None:
-        content = bleach.clean(
-            content,
-            attributes=["href", "title", "src"],
-            tags=BLEACH_ALLOWED_TAGS,
-            strip=True,
-        )
-        soup = BeautifulSoup(content, features="html.parser")
-
-        for img in soup.findAll("img"):
-            del img["width"]
-            del img["height"]
-            del img["class"]
-
-            src = img.get("src")
-            parsed_src = urlparse(src)
-
-            # Some feeds still use relative URLs, we can attempt to fix this
-            if parsed_src.netloc == "":
-                img["src"] = parsed_src._replace(
-                    netloc=feed_parsed.netloc, scheme=feed_parsed.scheme
-                ).geturl()
-
-            img["class"] = "rounded mx-auto d-block"
-
-            # TODO use the biggest image as the thumbnail
-            if thumbnail is None:
-                src = img.get("src")
-                fname, ext = splitext(urlparse(src).path)
-                if ext != ".gif" and ext != ".svg":
-                    if src is not None and len(src) < 500:
-                        # Check if dimensions are included in the image
-                        match = re.search(r"\d+x\d+", fname)
-                        if match:
-                            x, y = list(map(int, match.group().split("x")))
-                            if x < 100 or y < 100:
-                                continue
-                        thumbnail = src
-
-        content = str(soup)
+    if content is not None and sanitized:
+        content, thumbnail = clean_content(content, feed)
 
     published = None
     if entry.get("published"):
@@ -506,7 +604,7 @@ def parse_feed_entry(entry, feed):
     if entry.get("guid"):
         guid = entry["guid"]
 
-    return Entry(
+    instance = Entry(
         feed=feed,
         thumbnail=thumbnail,
         title=title,
@@ -518,4 +616,8 @@ def parse_feed_entry(entry, feed):
         author=entry["author"] if entry.get("author") else None,
         summary=summary,
         guid=guid,
+        sanitized=sanitized,
     )
+
+    # Raw entries are summarized once they're sanitized, from the cleaned HTML
+    return summarize_entry(instance) if sanitized else instance
@@ -0,0 +1,211 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+import feeds.counters as counters
+import feeds.versions as versions
+from feeds.models import Entry, ReadState, Subscription
+
+# Once this many read ids are held above the mark, it's moved up past the run
+# of read entries just above it
+COMPACT_AFTER = 256
+
+# Read ids kept above the mark once it's compacted, older ones are dropped and
+# the mark moved past them, so an old entry left unread can't hold it back
+COMPACT_KEEP = 128
+
+
+def encode(ids):
+    """Packs ids as sorted varint gaps, usually a byte or two per id"""
+
+    data = bytearray()
+    previous = 0
+    for pk in sorted(ids):
+        delta = pk - previous
+        previous = pk
+        while delta >= 0x80:
+            data.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return bytes(data)
+
+
+def decode(data):
+    ids = []
+    pk = delta = shift = 0
+    for byte in data:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            pk += delta
+            ids.append(pk)
+            delta = shift = 0
+    return ids
+
+
+class ReadSet:
+    """The entries of one feed a user has read"""
+
+    def __init__(self, read_up_to=0, read_ids=()):
+        self.read_up_to = read_up_to
+        self.read_ids = set(read_ids)
+
+    def __contains__(self, entry_id):
+        return entry_id <= self.read_up_to or entry_id in self.read_ids
+
+
+def load(user, feed_ids):
+    """Feed id -> ReadSet for the user, feeds they've never read are left out"""
+
+    return {
+        state.feed_id: ReadSet(state.read_up_to, decode(state.read_ids))
+        for state in ReadState.objects.filter(user=user, feed_id__in=set(feed_ids))
+    }
+
+
+def annotate(user, entries):
+    """Sets is_read on each of the entries, in a single query"""
+
+    states = load(user, {entry.feed_id for entry in entries})
+    unread = ReadSet()
+    for entry in entries:
+        entry.is_read = entry.pk in states.get(entry.feed_id, unread)
+    return entries
+
+
+def compact(feed_id, read_up_to, read_ids):
+    """
+    Moves the mark past the entries just above it that have been read, and
+    past all but the newest COMPACT_KEEP read ids regardless, returning the
+    new (read_up_to, read_ids, entries left unread that now count as read)
+    """
+
+    ids = sorted(read_ids)
+    cutoff = ids[-COMPACT_KEEP - 1] if len(ids) > COMPACT_KEEP else read_up_to
+    unread = (
+        Entry.objects.filter(feed_id=feed_id, pk__gt=read_up_to)
+        .exclude(pk__in=ids)
+        .aggregate(
+            skipped=Count("pk", filter=Q(pk__lte=cutoff)),
+            first=Min("pk", filter=Q(pk__gt=cutoff)),
+        )
+    )
+    if unread["first"] is not None:
+        ids = [pk for pk in ids if pk < unread["first"]]
+    read_up_to = max([cutoff, *ids])
+    return read_up_to, {pk for pk in read_ids if pk > read_up_to}, unread["skipped"]
+
+
+def save(user, states):
+    """Upserts (feed_id, read_up_to, read_ids) for the user in one statement"""
+
+    ReadState.objects.bulk_create(
+        [
+            ReadState(user=user, feed_id=feed_id, read_up_to=read_up_to, read_ids=ids)
+            for feed_id, read_up_to, ids in states
+        ],
+        update_conflicts=True,
+        unique_fields=["user", "feed"],
+        update_fields=["read_up_to", "read_ids"],
+    )
+
+
+@transaction.atomic
+def mark_read(user, entries):
+    """Marks entries read, given as (feed_id, entry_id) pairs"""
+
+    by_feed = defaultdict(set)
+    for feed_id, entry_id in entries:
+        by_feed[feed_id].add(entry_id)
+
+    states = {
+        state.feed_id: state
+        for state in ReadState.objects.select_for_update().filter(
+            user=user, feed_id__in=by_feed
+        )
+    }
+
+    changed = []
+    unread = {}
+    for feed_id, entry_ids in by_feed.items():
+        state = states.get(feed_id) or ReadState()
+        read_up_to, read_ids = state.read_up_to, set(decode(state.read_ids))
+        added = {pk for pk in entry_ids if pk > read_up_to} - read_ids
+        if not added:
+            continue
+
+        read_ids |= added
+        skipped = 0
+        if len(read_ids) > COMPACT_AFTER:
+            read_up_to, read_ids, skipped = compact(feed_id, read_up_to, read_ids)
+        unread[counters.key(counters.UNREAD, user.pk, feed_id)] = -len(added) - skipped
+        changed.append((feed_id, read_up_to, encode(read_ids)))
+
+    if changed:
+        save(user, changed)
+        versions.bump(versions.READ, user.pk)
+        # Only feeds the user subscribes to have an unread count
+        counters.add(unread, create=False)
+
+
+def mark_all_read(user, feed_ids):
+    """Marks every entry in the feeds read, however many there are"""
+
+    if not feed_ids:
+        return
+
+    latest = Entry.objects.order_by("-pk").values_list("pk", flat=True).first()
+    save(user, [(feed_id, latest or 0, b"") for feed_id in feed_ids])
+    counters.clear([counters.key(counters.UNREAD, user.pk, pk) for pk in feed_ids])
+    versions.bump(versions.READ, user.pk)
+
+
+def unread_counts(subscriptions):
+    """{(user_id, feed_id): unread entries} for a queryset of subscriptions"""
+
+    states = ReadState.objects.filter(user=OuterRef("user"), feed=OuterRef("feed"))
+    above = (
+        Entry.objects.filter(feed=OuterRef("feed"), pk__gt=OuterRef("read_up_to"))
+        .order_by()
+        .values("feed")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    rows = (
+        subscriptions.order_by()
+        .annotate(
+            read_up_to=Coalesce(Subquery(states.values("read_up_to")[:1]), 0),
+            read_ids=Subquery(states.values("read_ids")[:1]),
+            above=Coalesce(Subquery(above), 0),
+        )
+        .values_list("user_id", "feed_id", "above", "read_ids")
+    )
+    return {
+        (user_id, feed_id): above - len(decode(read_ids or b""))
+        for user_id, feed_id, above, read_ids in rows
+    }
+
+
+def refresh_unread(user_id, feed_ids):
+    """Recounts a user's unread entries in feeds they've (un)subscribed to"""
+
+    unread = unread_counts(
+        Subscription.objects.filter(user_id=user_id, feed_id__in=feed_ids)
+    )
+    counters.set_many(
+        {counters.key(counters.UNREAD, *ids): count for ids, count in unread.items()}
+    )
+    counters.delete(
+        [
+            counters.key(counters.UNREAD, user_id, pk)
+            for pk in feed_ids
+            if (user_id, pk) not in unread
+        ]
+    )
+
+
+def reconcile_unread():
+    counters.replace(counters.UNREAD, unread_counts(Subscription.objects.all()))
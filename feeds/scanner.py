@@ -0,0 +1,107 @@
+import re
+from urllib.parse import urljoin
+
+from lxml import etree
+
+FEED_TYPE = re.compile(r"application\/(atom|rss)\+xml$")
+
+# Fallback patterns for links in the page body, in order of preference
+ANCHOR_TEXT = re.compile("rss", re.I)
+ANCHOR_HREFS = (
+    re.compile(r"(index|feed|rss|atom).*.xml$"),
+    re.compile(r".*(rss|atom)$"),
+)
+
+COMMON_FAVICONS = ("/favicon.ico", "/favicon.png")
+
+
+class DiscoveryScanner:
+    """
+    lxml parser target that collects feed and favicon links from a HTML page
+    in a single pass. Pages are fed in incrementally and the scan is done as
+    soon as the end of <head> is reached with a feed link already found, so
+    the rest of the page never needs to be downloaded
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.alternates = []
+        self.anchors = []
+        self.icons = []
+        self.done = False
+
+        self._anchor = None
+
+    def start(self, tag, attrib):
+        if tag == "base" and attrib.get("href"):
+            self.base_url = urljoin(self.base_url, attrib["href"])
+
+        elif tag == "link":
+            href = attrib.get("href")
+            if not href:
+                return
+
+            rel = attrib.get("rel", "").lower().split()
+            if FEED_TYPE.search(attrib.get("type", "")):
+                self.alternates.append((href, attrib.get("title", "")))
+            elif any("icon" in value for value in rel) and not href.startswith("data"):
+                self.icons.append((href, rel))
+
+        elif tag == "a" and attrib.get("href"):
+            self._anchor = [attrib["href"]]
+
+        elif tag == "body":
+            self.end("head")
+
+    def end(self, tag):
+        if tag == "head" and self.alternates:
+            self.done = True
+
+        elif tag == "a" and self._anchor is not None:
+            href, *text = self._anchor
+            self.anchors.append((href, "".join(text).strip()))
+            self._anchor = None
+
+    def data(self, text):
+        if self._anchor is not None:
+            self._anchor.append(text)
+
+    def close(self):
+        return self
+
+    def feed_links(self):
+        """Candidate feed URLs, best first"""
+
+        links = [
+            href
+            for href, title in sorted(
+                self.alternates, key=lambda link: "comment" in link[1].lower()
+            )
+        ]
+
+        links.extend(href for href, text in self.anchors if ANCHOR_TEXT.search(text))
+
+        for pattern in ANCHOR_HREFS:
+            links.extend(href for href, _ in self.anchors if pattern.search(href))
+
+        return dedupe(urljoin(self.base_url, href) for href in links)
+
+    def favicons(self):
+        """Candidate favicon URLs, best first"""
+
+        # Prefer plain icons over the larger apple-touch/mask variants
+        links = [
+            href
+            for href, rel in sorted(self.icons, key=lambda icon: "icon" not in icon[1])
+        ]
+        links.extend(COMMON_FAVICONS)
+
+        return dedupe(urljoin(self.base_url, href) for href in links)
+
+
+def dedupe(urls):
+    return list(dict.fromkeys(urls))
+
+
+def html_parser(scanner, encoding=None):
+    return etree.HTMLParser(target=scanner, encoding=encoding)
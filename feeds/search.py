@@ -0,0 +1,224 @@
+import logging
+import re
+
+from django.db import connection
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+from feeds.models import Entry, Subscription
+
+logger = logging.getLogger(__name__)
+
+# Wrapped around matching terms in snippets, then swapped for <mark> once the
+# rest of the snippet has been escaped
+START, STOP = "\x02", "\x03"
+
+WORD = re.compile(r"\w+")
+
+ENTRIES_SQLITE = f"""
+    SELECT feeds_entry_fts.rowid,
+        snippet(feeds_entry_fts, -1, '{START}', '{STOP}', '…', 16)
+    FROM feeds_entry_fts
+    JOIN feeds_timelineentry ON feeds_timelineentry.entry_id = feeds_entry_fts.rowid
+    WHERE feeds_entry_fts MATCH %s AND feeds_timelineentry.user_id = %s
+    ORDER BY bm25(feeds_entry_fts, 10.0, 4.0, 1.0)
+    LIMIT %s
+"""
+
+ENTRIES_POSTGRES = """
+    SELECT feeds_entry.id,
+        ts_headline(
+            'english',
+            coalesce(feeds_entry.summary, feeds_entry.content, ''),
+            query,
+            %s
+        )
+    FROM feeds_entry
+    JOIN feeds_timelineentry ON feeds_timelineentry.entry_id = feeds_entry.id,
+        websearch_to_tsquery('english', %s) query
+    WHERE feeds_entry.search_vector @@ query AND feeds_timelineentry.user_id = %s
+    ORDER BY ts_rank(feeds_entry.search_vector, query) DESC
+    LIMIT %s
+"""
+
+FEEDS_SQLITE = """
+    SELECT feeds_subscription.id
+    FROM feeds_feed_fts
+    JOIN feeds_subscription ON feeds_subscription.feed_id = feeds_feed_fts.rowid
+    WHERE feeds_feed_fts MATCH %s AND feeds_subscription.user_id = %s
+    ORDER BY bm25(feeds_feed_fts, 4.0, 1.0)
+    LIMIT %s
+"""
+
+FEEDS_POSTGRES = """
+    SELECT feeds_subscription.id
+    FROM feeds_feed
+    JOIN feeds_subscription ON feeds_subscription.feed_id = feeds_feed.id,
+        websearch_to_tsquery('english', %s) query
+    WHERE feeds_feed.search_vector @@ query AND feeds_subscription.user_id = %s
+    ORDER BY ts_rank(feeds_feed.search_vector, query) DESC
+    LIMIT %s
+"""
+
+
+# The triggers keeping the SQLite full text indexes in sync, as created by
+# migration 0012. SQLite drops them whenever a migration rebuilds their table
+SQLITE_TRIGGERS = {
+    "feeds_entry_fts": {
+        "feeds_entry_fts_insert": """
+            CREATE TRIGGER feeds_entry_fts_insert AFTER INSERT ON feeds_entry BEGIN
+                INSERT INTO feeds_entry_fts(rowid, title, summary, content)
+                VALUES (new.id, new.title, new.summary, new.content);
+            END
+        """,
+        "feeds_entry_fts_delete": """
+            CREATE TRIGGER feeds_entry_fts_delete AFTER DELETE ON feeds_entry BEGIN
+                INSERT INTO feeds_entry_fts(feeds_entry_fts, rowid, title, summary,
+                    content)
+                VALUES ('delete', old.id, old.title, old.summary, old.content);
+            END
+        """,
+        "feeds_entry_fts_update": """
+            CREATE TRIGGER feeds_entry_fts_update
+            AFTER UPDATE OF title, summary, content ON feeds_entry BEGIN
+                INSERT INTO feeds_entry_fts(feeds_entry_fts, rowid, title, summary,
+                    content)
+                VALUES ('delete', old.id, old.title, old.summary, old.content);
+                INSERT INTO feeds_entry_fts(rowid, title, summary, content)
+                VALUES (new.id, new.title, new.summary, new.content);
+            END
+        """,
+    },
+    "feeds_feed_fts": {
+        "feeds_feed_fts_insert": """
+            CREATE TRIGGER feeds_feed_fts_insert AFTER INSERT ON feeds_feed BEGIN
+                INSERT INTO feeds_feed_fts(rowid, title, subtitle)
+                VALUES (new.id, new.title, new.subtitle);
+            END
+        """,
+        "feeds_feed_fts_delete": """
+            CREATE TRIGGER feeds_feed_fts_delete AFTER DELETE ON feeds_feed BEGIN
+                INSERT INTO feeds_feed_fts(feeds_feed_fts, rowid, title, subtitle)
+                VALUES ('delete', old.id, old.title, old.subtitle);
+            END
+        """,
+        "feeds_feed_fts_update": """
+            CREATE TRIGGER feeds_feed_fts_update AFTER UPDATE OF title, subtitle
+            ON feeds_feed BEGIN
+                INSERT INTO feeds_feed_fts(feeds_feed_fts, rowid, title, subtitle)
+                VALUES ('delete', old.id, old.title, old.subtitle);
+                INSERT INTO feeds_feed_fts(rowid, title, subtitle)
+                VALUES (new.id, new.title, new.subtitle);
+            END
+        """,
+    },
+}
+
+
+def restore_triggers(connection):
+    """
+    Recreates any of the SQLite index triggers a migration dropped, and rebuilds
+    the indexes they should have been keeping up to date, returning their names
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master")
+        existing = set(cursor.fetchall())
+
+        restored = []
+        for table, triggers in SQLITE_TRIGGERS.items():
+            if ("table", table) not in existing:
+                # Migrated back to before the indexes were added
+                continue
+            missing = [name for name in triggers if ("trigger", name) not in existing]
+            for name in missing:
+                cursor.execute(triggers[name])
+            if missing:
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+                restored.extend(missing)
+
+    if restored:
+        logger.warning(
+            "Recreated search triggers dropped by a migration: %s",
+            ", ".join(restored),
+        )
+    return restored
+
+
+def match_query(text):
+    """
+    Turns free text into an FTS5 query matching every word, the last as a
+    prefix so results show up while typing
+    """
+
+    words = WORD.findall(text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def highlight(snippet):
+    snippet = escape(strip_tags(snippet))
+    return mark_safe(snippet.replace(START, "<mark>").replace(STOP, "</mark>"))
+
+
+def search_entries(user, text, limit=100):
+    """
+    Entries on the user's timeline matching text, best first, with a
+    highlighted snippet of the match
+    """
+
+    if connection.vendor == "sqlite":
+        query = match_query(text)
+        if query is None:
+            return []
+        sql, params = ENTRIES_SQLITE, [query, user.pk, limit]
+    elif connection.vendor == "postgresql":
+        options = f"StartSel={START}, StopSel={STOP}, MaxWords=24, MinWords=8"
+        sql, params = ENTRIES_POSTGRES, [options, text, user.pk, limit]
+    else:
+        entries = Entry.objects.select_related("feed").filter(
+            title__icontains=text, timeline__user=user
+        )[:limit]
+        return list(entries)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    entries = (
+        Entry.objects.select_related("feed")
+        .defer("content", "summary")
+        .in_bulk(pk for pk, _ in rows)
+    )
+    results = []
+    for pk, snippet in rows:
+        entry = entries[pk]
+        entry.snippet = highlight(snippet)
+        results.append(entry)
+    return results
+
+
+def search_subscriptions(user, text, limit=100):
+    """The user's subscriptions to feeds matching text, best first"""
+
+    subscriptions = Subscription.objects.select_related("feed", "category").filter(
+        user=user
+    )
+
+    if connection.vendor == "sqlite":
+        query = match_query(text)
+        if query is None:
+            return []
+        sql, params = FEEDS_SQLITE, [query, user.pk, limit]
+    elif connection.vendor == "postgresql":
+        sql, params = FEEDS_POSTGRES, [text, user.pk, limit]
+    else:
+        return list(subscriptions.filter(feed__title__icontains=text)[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [pk for pk, in cursor.fetchall()]
+
+    found = subscriptions.in_bulk(ids)
+    return [found[pk] for pk in ids]
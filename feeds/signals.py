@@ -0,0 +1,63 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+import feeds.counters as counters
+import feeds.readstate as readstate
+import feeds.search as search
+import feeds.timeline as timeline
+import feeds.versions as versions
+from feeds.models import Category, Feed, Subscription
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def subscriptions_changed(sender, instance, **kwargs):
+    versions.bump(versions.SUBSCRIPTIONS, instance.user_id)
+
+
+@receiver(post_save, sender=Feed)
+def feed_changed(sender, instance, created, update_fields, **kwargs):
+    """Subscribers' sidebars show the feed's title and favicon"""
+
+    if created or (update_fields and not {"title", "slug", "favicon"} & update_fields):
+        return
+    versions.bump(versions.FEED, instance.slug)
+    versions.bump_many(
+        versions.SUBSCRIPTIONS,
+        Subscription.objects.filter(feed=instance).values_list("user_id", flat=True),
+    )
+
+
+@receiver(post_save, sender=Subscription)
+def subscribed(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, [instance.feed_id])
+
+
+@receiver(post_delete, sender=Subscription)
+def unsubscribed(sender, instance, **kwargs):
+    timeline.remove(instance.user_id, instance.feed_id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def recount_subscriptions(sender, instance, **kwargs):
+    counters.refresh_subscriptions(instance.user_id, [instance.feed_id])
+    readstate.refresh_unread(instance.user_id, [instance.feed_id])
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    counters.delete([counters.key(counters.SUBSCRIPTIONS, instance.pk)])
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    """Migrations that rebuild feeds_entry or feeds_feed on SQLite drop these"""
+
+    connection = connections[using]
+    if sender.name == "feeds" and connection.vendor == "sqlite":
+        search.restore_triggers(connection)
@@ -4,3 +4,33 @@ form.addEventListener('submit', (event) => {
 	document.getElementById('results').innerHTML = "";
 	document.getElementById('loading').classList.remove('d-none');
 })
+
+const job = document.getElementById("job");
+
+const stages = {
+	queued: "Waiting to look for feeds…",
+	crawling: "Looking for feeds…",
+	ingesting: "Found a feed, fetching entries…",
+};
+
+function pollJob() {
+	fetch(job.dataset.statusUrl)
+		.then((response) => response.json())
+		.then((status) => {
+			if (status.stage === "done") {
+				// The result is cached now, so reloading shows it straight away
+				window.location.reload();
+			} else if (status.stage === "failed" || status.stage === "unknown") {
+				job.classList.add('d-none');
+				document.getElementById('jobFailed').classList.remove('d-none');
+			} else {
+				document.getElementById('jobStage').textContent = stages[status.stage];
+				setTimeout(pollJob, 1000);
+			}
+		})
+		.catch(() => setTimeout(pollJob, 2000));
+}
+
+if (job !== null) {
+	pollJob();
+}
@@ -0,0 +1,46 @@
+const entries = document.getElementById("entries");
+const more = document.getElementById("moreEntries");
+
+// Pages are appended as the reader scrolls, so the links aren't needed
+more.querySelector("nav").classList.add("d-none");
+
+let nextUrl = more.dataset.nextUrl;
+let loading = false;
+
+function loadMore() {
+	if (loading || !nextUrl) {
+		return;
+	}
+	loading = true;
+	fetch(nextUrl)
+		.then((response) => {
+			if (!response.ok) {
+				throw new Error(response.statusText);
+			}
+			nextUrl = response.headers.get("X-Next-Page");
+			return response.text();
+		})
+		.then((html) => {
+			entries.insertAdjacentHTML("beforeend", html);
+			if (!nextUrl) {
+				observer.disconnect();
+			}
+			loading = false;
+		})
+		.catch(() => {
+			// Fall back to the page links
+			observer.disconnect();
+			more.querySelector("nav").classList.remove("d-none");
+		});
+}
+
+const observer = new IntersectionObserver(
+	(items) => {
+		if (items.some((item) => item.isIntersecting)) {
+			loadMore();
+		}
+	},
+	{ rootMargin: "800px" },
+);
+
+observer.observe(more);
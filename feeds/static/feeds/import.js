@@ -0,0 +1,24 @@
+const job = document.getElementById("job");
+
+function pollJob() {
+	fetch(job.dataset.statusUrl)
+		.then((response) => response.json())
+		.then((status) => {
+			const processed = status.done + status.failed;
+			document.getElementById('jobProcessed').textContent = processed;
+			document.getElementById('jobTotal').textContent = status.total;
+			document.getElementById('jobFailed').textContent = status.failed;
+			if (status.total) {
+				const percent = Math.round(processed / status.total * 100);
+				document.getElementById('jobProgress').style.width = `${percent}%`;
+			}
+			if (status.finished_at === null) {
+				setTimeout(pollJob, 2000);
+			} else {
+				document.getElementById('jobStage').firstChild.textContent = "Finished importing ";
+			}
+		})
+		.catch(() => setTimeout(pollJob, 5000));
+}
+
+pollJob();
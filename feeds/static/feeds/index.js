@@ -0,0 +1,69 @@
+const entries = document.getElementById("entries");
+const banner = document.getElementById("newEntries");
+
+let newerUrl = banner.dataset.newerUrl;
+let loading = false;
+// Set when more entries are announced while a fetch is already running
+let pending = false;
+let added = 0;
+
+function showAdded(count) {
+	added += count;
+	banner.querySelector("span").textContent =
+		`${added} new ${added === 1 ? "entry" : "entries"}`;
+	banner.classList.remove("d-none");
+}
+
+function offerReload() {
+	source.close();
+	const link = document.createElement("a");
+	link.href = window.location.href;
+	link.className = "alert-link";
+	link.textContent = "Reload to see the latest entries";
+	banner.querySelector("span").replaceChildren(link);
+	banner.classList.remove("d-none");
+}
+
+function loadNewer() {
+	if (loading) {
+		pending = true;
+		return;
+	}
+	loading = true;
+	pending = false;
+	let more = false;
+	fetch(newerUrl)
+		.then((response) => {
+			if (!response.ok) {
+				throw new Error(response.statusText);
+			}
+			newerUrl = response.headers.get("X-Newer-Page") || newerUrl;
+			more = response.headers.has("X-More");
+			return response.text();
+		})
+		.then((html) => {
+			if (more) {
+				// Too many arrived to add them here
+				offerReload();
+				return;
+			}
+			const template = document.createElement("template");
+			template.innerHTML = html;
+			const count = template.content.children.length;
+			entries.prepend(template.content);
+			if (count) {
+				showAdded(count);
+			}
+			loading = false;
+			if (pending) {
+				loadNewer();
+			}
+		})
+		.catch(() => {
+			// Stop listening, a reload still shows everything
+			source.close();
+		});
+}
+
+const source = new EventSource(banner.dataset.liveUrl);
+source.addEventListener("entries", loadNewer);
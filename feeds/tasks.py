@@ -1,5 +1,16 @@
+import asyncio
+
 from celery import shared_task
 from django.core.management import call_command
+from django.db import IntegrityError
+
+import feeds.clients as clients
+import feeds.counters as counters
+import feeds.crawler as crawler
+import feeds.discovery as discovery
+import feeds.importer as importer
+import feeds.readstate as readstate
+from feeds.models import Feed, ImportJob, ImportRecord
 
 
 @shared_task(track_started=True, task_time_limit=60)
@@ -7,3 +18,81 @@ def update():
     call_command(
         "update",
     )
+
+
+@shared_task(track_started=True)
+def reconcile_counters():
+    """Recomputes the maintained counters, correcting any drift"""
+
+    counters.reconcile()
+    readstate.reconcile_unread()
+
+
+@shared_task(track_started=True, task_time_limit=discovery.JOB_TIMEOUT)
+def discover(job_id, url, user_id):
+    discovery.set_job_status(job_id, "crawling")
+
+    try:
+        resp, parsed, favicon = clients.run(crawler.crawl(url))
+
+        feed = None
+        if resp is not None:
+            discovery.set_job_status(job_id, "ingesting")
+            try:
+                feed = crawler.ingest_feed(resp, parsed, favicon)
+            except IntegrityError:
+                # The crawl led to a feed we already have
+                feed = Feed.objects.filter(url=str(resp.url)).first()
+
+        feed_url = feed.url if feed is not None else None
+        discovery.remember(url, feed_url)
+        discovery.set_job_status(job_id, "done", feed_url=feed_url)
+    except Exception:
+        discovery.set_job_status(job_id, "failed")
+        raise
+    finally:
+        discovery.finish_job(url, user_id)
+
+
+async def crawl_records(records):
+    client = clients.get_client()
+    return await asyncio.gather(
+        *(importer.crawl_record(client, record) for record in records),
+        return_exceptions=True,
+    )
+
+
+@shared_task(track_started=True, task_time_limit=discovery.JOB_TIMEOUT)
+def import_feeds(job_id, record_ids):
+    """Imports a chunk of the records from an uploaded OPML file"""
+
+    job = ImportJob.objects.select_related("user").get(pk=job_id)
+    records = list(
+        ImportRecord.objects.filter(pk__in=record_ids, state=ImportRecord.State.PENDING)
+    )
+
+    try:
+        results = clients.run(crawl_records(records))
+
+        batch = importer.Importer(job.user, batch_size=len(records) + 1)
+        failed = 0
+        for record, result in zip(records, results):
+            if isinstance(result, Exception):
+                importer.mark_failed(job.user, record.url, str(result) or repr(result))
+                failed += 1
+            else:
+                batch.add(record.url, *result, record.category)
+
+        imported = batch.flush()
+        importer.mark_imported(job.user, imported)
+        for url, feed_url in imported:
+            if feed_url is not None:
+                discovery.remember(url, feed_url)
+
+        # Records that were no longer pending were handled elsewhere, so count as done
+        failed += sum(1 for _, feed_url in imported if feed_url is None)
+        importer.advance_job(job_id, len(record_ids) - failed, failed)
+    except Exception:
+        # Still count the chunk, so the job doesn't wait on it forever
+        importer.advance_job(job_id, 0, len(record_ids))
+        raise
@@ -1,6 +1,9 @@
 from urllib.parse import urlparse
 
 from django import template
+from django.utils.html import format_html
+
+import feeds.favicons as favicons
 
 register = template.Library()
 
@@ -8,3 +11,30 @@ register = template.Library()
 @register.filter
 def netloc(value):
     return urlparse(value).netloc
+
+
+@register.simple_tag
+def favicon(image, style=""):
+    """Renders a feed favicon, using the pre-sized variants where available"""
+
+    if not image:
+        return ""
+
+    if not favicons.is_stored(image.name):
+        return format_html('<img style="{}" src="{}" loading="lazy">', style, image.url)
+
+    def srcset(fmt):
+        small, large = (
+            image.storage.url(favicons.variant_name(image.name, size, fmt))
+            for size in favicons.SIZES
+        )
+        return f"{small} 1x, {large} 2x"
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img style="{}" src="{}" srcset="{}" loading="lazy"></picture>',
+        srcset("webp"),
+        style,
+        image.storage.url(favicons.variant_name(image.name, favicons.SIZES[0], "png")),
+        srcset("png"),
+    )
@@ -1,6 +1,71 @@
-from django.test import TestCase
+import asyncio
+import io
+from datetime import timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlparse
 
-from feeds.crawler import translate_common_feed_extensions
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.images import ImageFile
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+from PIL import Image
+
+import feeds.counters as counters
+import feeds.discovery as discovery
+import feeds.favicons as favicons
+import feeds.hosts as hosts
+import feeds.live as live
+import feeds.parser as parser
+import feeds.readstate as readstate
+import feeds.search as search
+import feeds.tasks as tasks
+import feeds.timeline as timeline
+import feeds.urls
+import feeds.versions as versions
+import feeds.views as views
+from feeds.crawler import (
+    PROBE_BYTES,
+    Budget,
+    BudgetExceeded,
+    Crawler,
+    fetch_confirmed,
+    looks_like_feed,
+    open_probe,
+    translate_common_feed_extensions,
+)
+from feeds.importer import (
+    Importer,
+    add_to_job,
+    advance_job,
+    journal,
+    mark_failed,
+    mark_imported,
+    parse_opml,
+    pending,
+)
+from feeds.management.commands.update import ingest_entries
+from feeds.models import (
+    Category,
+    Counter,
+    Entry,
+    Feed,
+    ImportJob,
+    ImportRecord,
+    ReadState,
+    Subscription,
+    TimelineEntry,
+)
+from feeds.pagination import CursorPaginator
+from feeds.scanner import DiscoveryScanner, html_parser
+from feeds.search import search_entries
 
 
 class TestFindFeedFromURL(TestCase):
@@ -69,3 +134,1352 @@ class TestFindFeedFromURL(TestCase):
             translate_common_feed_extensions("https://medium.com/geekculture"),
             "https://medium.com/feed/geekculture",
         )
+
+
+def example_rule(parsed):
+    return parsed._replace(path="/custom.xml").geturl()
+
+
+class TestHostRules(SimpleTestCase):
+    @override_settings(FEEDS_HOST_RULES={"example.com": "feeds.tests.example_rule"})
+    def test_matches_longest_registered_suffix(self):
+        rules = hosts.HostRules()
+        rules.register("blog.example.com")(lambda parsed: "https://blog/feed")
+
+        self.assertEqual(
+            rules.translate(urlparse("https://jack.blog.example.com/")),
+            "https://blog/feed",
+        )
+        self.assertEqual(
+            rules.translate(urlparse("https://www.example.com/about")),
+            "https://www.example.com/custom.xml",
+        )
+        self.assertIsNone(rules.translate(urlparse("https://notexample.com")))
+
+
+class TestLazySanitize(TestCase):
+    def setUp(self):
+        self.feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+        self.raw = {
+            "title": "Hello",
+            "link": "/hello",
+            "content": '<p onclick="x()">Hi<script>alert(1)</script></p>'
+            '<img src="/images/photo.jpg">',
+        }
+
+    @override_settings(FEEDS_LAZY_SANITIZE=True)
+    def test_sanitizes_on_first_read(self):
+        entry = parser.parse_feed_entry(self.raw, self.feed)
+        entry.save()
+
+        self.assertFalse(entry.sanitized)
+        self.assertEqual(entry.content, self.raw["content"])
+        self.assertIsNone(entry.thumbnail)
+
+        parser.sanitize_entries([entry])
+
+        entry.refresh_from_db()
+        self.assertTrue(entry.sanitized)
+        self.assertNotIn("onclick", entry.content)
+        self.assertNotIn("<script>", entry.content)
+        self.assertEqual(entry.thumbnail, "https://example.com/images/photo.jpg")
+
+    @override_settings(FEEDS_LAZY_SANITIZE=True)
+    def test_sanitizes_deferred_entries(self):
+        parser.parse_feed_entry(self.raw, self.feed).save()
+
+        entry = Entry.objects.select_related("feed").defer("content", "summary").get()
+        self.assertIsNone(entry.excerpt)
+
+        # The HTML is loaded in one query, then written back sanitized along
+        # with the excerpt
+        with self.assertNumQueries(2):
+            parser.sanitize_entries([entry])
+        self.assertEqual(entry.thumbnail, "https://example.com/images/photo.jpg")
+
+        # Summarized the same as an entry sanitized at ingest
+        with override_settings(FEEDS_LAZY_SANITIZE=False):
+            eager = parser.parse_feed_entry(self.raw, self.feed)
+        entry.refresh_from_db()
+        self.assertEqual(
+            (entry.excerpt, entry.word_count, entry.reading_time),
+            (eager.excerpt, eager.word_count, eager.reading_time),
+        )
+
+    @override_settings(FEEDS_LAZY_SANITIZE=True)
+    def test_excerpts_cleaned_summary(self):
+        self.raw["summary"] = '<p>Short</p><a href="/hello">Continue reading</a>'
+        entry = parser.parse_feed_entry(self.raw, self.feed)
+        entry.save()
+
+        parser.sanitize_entries([entry])
+        self.assertEqual(entry.excerpt, "Short")
+
+    def test_sanitizes_eagerly_by_default(self):
+        entry = parser.parse_feed_entry(self.raw, self.feed)
+
+        self.assertTrue(entry.sanitized)
+        self.assertNotIn("onclick", entry.content)
+
+        with self.assertNumQueries(0):
+            parser.sanitize_entries([entry])
+
+
+RSS_FEED = b"""<?xml version="1.0"?>
+<rss version="2.0">
+  <channel>
+    <title>Example</title>
+    <link>https://example.com/</link>
+    <item><title>Hello</title><link>https://example.com/hello</link></item>
+  </channel>
+</rss>
+"""
+
+
+class TestCrawler(SimpleTestCase):
+    def crawl(self, handler, url, **kwargs):
+        async def run():
+            transport = httpx.MockTransport(handler)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await Crawler(client, url, **kwargs).crawl()
+
+        return asyncio.run(run())
+
+    def test_probes_common_extensions_concurrently(self):
+        in_flight = 0
+        peak = 0
+
+        async def handler(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await asyncio.sleep(0.01)
+            finally:
+                in_flight -= 1
+            if request.url.path == "/rss.xml":
+                return httpx.Response(
+                    200, content=RSS_FEED, headers={"content-type": "text/xml"}
+                )
+            if request.url.path == "/blog":
+                return httpx.Response(
+                    200, html="<html><head></head><body></body></html>"
+                )
+            return httpx.Response(404)
+
+        resp, parsed, _ = self.crawl(handler, "https://example.com/blog", concurrency=4)
+
+        self.assertEqual(str(resp.url), "https://example.com/rss.xml")
+        self.assertEqual(parsed["title"], "Example")
+        self.assertGreater(peak, 1)
+        self.assertLessEqual(peak, 4)
+
+    def serve_ranges(self, body, sent):
+        """A handler that behaves like a server honouring range requests"""
+
+        def handler(request):
+            start, _, end = (
+                request.headers.get("range", "=").split("=")[1].partition("-")
+            )
+            if not start:
+                sent.append(len(body))
+                return httpx.Response(200, content=body)
+            end = int(end) if end else len(body) - 1
+            content = body[int(start) : end + 1]
+            sent.append(len(content))
+            return httpx.Response(
+                206,
+                content=content,
+                headers={"content-range": f"bytes {start}-{end}/{len(body)}"},
+            )
+
+        return handler
+
+    def test_fetches_body_only_once_confirmed(self):
+        body = RSS_FEED + b" " * (PROBE_BYTES * 2)
+        sent = []
+
+        async def fetch(confirm):
+            transport = httpx.MockTransport(self.serve_ranges(body, sent))
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await fetch_confirmed(
+                    client, "https://example.com/feed", confirm
+                )
+
+        self.assertIsNone(asyncio.run(fetch(lambda resp, prefix: False)))
+        self.assertEqual(sent, [PROBE_BYTES])
+
+        resp = asyncio.run(fetch(lambda resp, prefix: looks_like_feed(prefix)))
+        self.assertEqual(resp.content, body)
+        self.assertEqual(sent, [PROBE_BYTES, PROBE_BYTES, len(body) - PROBE_BYTES])
+
+    def test_stops_downloading_past_byte_budget(self):
+        sent = 0
+
+        async def endless():
+            nonlocal sent
+            while True:
+                sent += PROBE_BYTES
+                yield b" " * PROBE_BYTES
+
+        def handler(request):
+            if request.headers["range"] == f"bytes=0-{PROBE_BYTES - 1}":
+                return httpx.Response(
+                    206,
+                    content=RSS_FEED.ljust(PROBE_BYTES),
+                    headers={"content-range": f"bytes 0-{PROBE_BYTES - 1}/*"},
+                )
+            return httpx.Response(206, content=endless())
+
+        async def fetch():
+            transport = httpx.MockTransport(handler)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await fetch_confirmed(
+                    client,
+                    "https://example.com/feed",
+                    lambda resp, prefix: True,
+                    Budget(max_bytes=PROBE_BYTES * 4),
+                )
+
+        with self.assertRaises(BudgetExceeded):
+            asyncio.run(fetch())
+        self.assertLessEqual(sent, PROBE_BYTES * 4)
+
+    def test_scans_pages_only_as_far_as_needed(self):
+        link = b'<link rel="alternate" type="application/rss+xml" href="/feed">'
+        body = b"<body>" + b" " * (PROBE_BYTES * 2) + b"</body></html>"
+        sent = []
+
+        async def scan(page):
+            transport = httpx.MockTransport(self.serve_ranges(page, sent))
+            async with httpx.AsyncClient(transport=transport) as client:
+                crawler = Crawler(client, "https://example.com/")
+                async with open_probe(client, crawler.url, crawler.budget) as probe:
+                    return await crawler.scan_page(probe)
+
+        # The whole head was in the probe
+        scanner = asyncio.run(scan(b"<html><head>" + link + b"</head>" + body))
+        self.assertEqual(scanner.feed_links(), ["https://example.com/feed"])
+        self.assertEqual(sent, [PROBE_BYTES])
+
+        # Only what follows the probe is fetched to finish the head
+        sent.clear()
+        page = b"<html><head>" + b"<!-- -->" * PROBE_BYTES + link + b"</head>" + body
+        scanner = asyncio.run(scan(page))
+        self.assertEqual(scanner.feed_links(), ["https://example.com/feed"])
+        self.assertEqual(sent, [PROBE_BYTES, len(page) - PROBE_BYTES])
+
+    def test_respects_deadline(self):
+        async def handler(request):
+            await asyncio.sleep(5)
+            return httpx.Response(404)
+
+        resp, parsed, favicon = self.crawl(
+            handler, "https://example.com/blog", deadline=0.1
+        )
+
+        self.assertIsNone(resp)
+        self.assertIsNone(parsed)
+
+    def test_respects_request_budget(self):
+        paths = []
+
+        def handler(request):
+            paths.append(request.url.path)
+            return httpx.Response(404)
+
+        resp, parsed, favicon = self.crawl(
+            handler, "https://example.com/blog", budget=Budget(max_requests=3)
+        )
+
+        self.assertIsNone(parsed)
+        self.assertEqual(len(paths), 3)
+
+
+class TestDiscoveryCache(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_normalizes_urls(self):
+        self.assertEqual(
+            discovery.normalize_url("https://www.Example.com/blog/"),
+            discovery.normalize_url("example.com/blog"),
+        )
+
+    def test_remembers_positive_and_negative_results(self):
+        self.assertEqual(discovery.lookup("example.com"), (False, None))
+
+        discovery.remember("https://example.com/", "https://example.com/feed.xml")
+        self.assertEqual(
+            discovery.lookup("http://www.example.com"),
+            (True, "https://example.com/feed.xml"),
+        )
+
+        discovery.remember("nofeed.example.com", None)
+        self.assertEqual(discovery.lookup("https://nofeed.example.com"), (True, None))
+
+    @override_settings(FEEDS_DISCOVERY_MAX_JOBS=2, FEEDS_DISCOVERY_MAX_USER_JOBS=1)
+    def test_limits_concurrent_jobs(self):
+        discovery.start_job("a.example.com", 1)
+        with self.assertRaises(discovery.Saturated):
+            discovery.start_job("b.example.com", 1)
+
+        discovery.start_job("b.example.com", 2)
+        with self.assertRaises(discovery.Saturated):
+            discovery.start_job("c.example.com", 3)
+
+        discovery.finish_job("a.example.com", 1)
+        discovery.start_job("c.example.com", 3)
+
+
+class TestImporter(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jack")
+
+    def crawled(self, url):
+        resp = httpx.Response(200, content=RSS_FEED, request=httpx.Request("GET", url))
+        return resp, parser.parse(io.BytesIO(RSS_FEED))
+
+    def test_writes_feeds_in_batches(self):
+        importer = Importer(self.user, batch_size=3)
+
+        resp, parsed = self.crawled("https://a.example.com/feed")
+        self.assertEqual(importer.add("a.example.com", resp, parsed, None, "Tech"), [])
+        resp, parsed = self.crawled("https://b.example.com/feed")
+        self.assertEqual(importer.add("b.example.com", resp, parsed, None, "Tech"), [])
+        self.assertFalse(Feed.objects.exists())
+
+        resp, parsed = self.crawled("https://c.example.com/feed")
+        with self.assertNumQueries(25):
+            results = importer.add("c.example.com", resp, parsed, None, None)
+
+        self.assertEqual(
+            results,
+            [
+                ("a.example.com", "https://a.example.com/feed"),
+                ("b.example.com", "https://b.example.com/feed"),
+                ("c.example.com", "https://c.example.com/feed"),
+            ],
+        )
+        self.assertEqual(Entry.objects.count(), 3)
+        self.assertEqual(
+            Subscription.objects.filter(user=self.user, category__name="Tech").count(),
+            2,
+        )
+
+        importer.subscribe("d.example.com", "https://a.example.com/feed", "News")
+        resp, parsed = self.crawled("https://a.example.com/feed")
+        importer.add("e.example.com", resp, parsed, None, "News")
+        importer.flush()
+
+        # Feeds that already exist are subscribed to but not duplicated
+        self.assertEqual(Feed.objects.count(), 3)
+        self.assertEqual(Entry.objects.count(), 3)
+        self.assertEqual(Subscription.objects.count(), 3)
+
+    def test_jobs_leave_records_claimed_by_running_jobs(self):
+        feeds = [("https://a.example.com", None), ("https://b.example.com", None)]
+        first = ImportJob.objects.create(user=self.user)
+        second = ImportJob.objects.create(user=self.user)
+
+        self.assertEqual(len(add_to_job(first, feeds[:1])), 1)
+        self.assertEqual(len(add_to_job(second, feeds)), 1)
+        self.assertEqual(
+            ImportRecord.objects.get(url="https://a.example.com").job, first
+        )
+
+        # Once the first job is finished its pending records can be taken over
+        first.finished_at = timezone.now()
+        first.save()
+        self.assertEqual(len(add_to_job(second, feeds)), 1)
+        second.refresh_from_db()
+        self.assertEqual(second.total, 2)
+
+    def test_journal_resumes_and_retries(self):
+        journal(
+            self.user,
+            [("https://a.example.com", "Tech"), ("https://b.example.com", None)],
+        )
+        mark_failed(self.user, "https://b.example.com", "No feed found")
+        journal(
+            self.user,
+            [("https://a.example.com", None), ("https://b.example.com", None)],
+        )
+
+        self.assertEqual(
+            [record.url for record in pending(self.user)], ["https://a.example.com"]
+        )
+
+        resp, parsed = self.crawled("https://a.example.com/feed")
+        importer = Importer(self.user)
+        importer.add("https://a.example.com", resp, parsed, None, "Tech")
+        mark_imported(self.user, importer.flush())
+        self.assertFalse(pending(self.user).exists())
+
+        failed = ImportRecord.objects.get(url="https://b.example.com")
+        self.assertEqual(failed.attempts, 1)
+        self.assertEqual(failed.reason, "No feed found")
+
+        # Failed URLs are retried once their backoff has passed
+        self.assertFalse(pending(self.user, retry_failed=True).exists())
+        failed.next_attempt_at = timezone.now()
+        failed.save()
+        self.assertEqual(list(pending(self.user, retry_failed=True)), [failed])
+
+
+class TestFavicons(SimpleTestCase):
+    def make_icon(self, name):
+        buf = io.BytesIO()
+        Image.new("RGB", (128, 128), "red").save(buf, format="PNG")
+        return ImageFile(buf, name=name)
+
+    def test_stores_identical_icons_once(self):
+        storage = InMemoryStorage()
+
+        first = favicons.store(self.make_icon("a.example.com.png"), storage)
+        second = favicons.store(self.make_icon("b.example.com.ico"), storage)
+
+        self.assertEqual(first, second)
+        self.assertTrue(favicons.is_stored(first))
+
+        _, files = storage.listdir(first.rsplit("/", 1)[0])
+        self.assertEqual(len(files), 1 + len(favicons.SIZES) * len(favicons.FORMATS))
+
+        for size in favicons.SIZES:
+            with storage.open(favicons.variant_name(first, size, "webp")) as f:
+                self.assertEqual(Image.open(f).size, (size, size))
+
+
+class TestDiscoveryScanner(SimpleTestCase):
+    def scan(self, *chunks):
+        scanner = DiscoveryScanner("https://example.com/blog/")
+        parser = html_parser(scanner)
+        for chunk in chunks:
+            if scanner.done:
+                break
+            parser.feed(chunk)
+        parser.close()
+        return scanner
+
+    def test_stops_at_end_of_head(self):
+        scanner = self.scan(
+            b"<html><head>"
+            b'<link rel="alternate" type="application/rss+xml" title="Comments"'
+            b' href="/comments.xml">'
+            b'<link rel="alternate" type="application/atom+xml" href="atom.xml">'
+            b'<link rel="apple-touch-icon" href="/touch.png">'
+            b'<link rel="shortcut icon" href="/icon.png">'
+            b"</head>",
+            b'<body><a href="/never-seen.xml">RSS</a></body></html>',
+        )
+
+        self.assertTrue(scanner.done)
+        self.assertEqual(
+            scanner.feed_links(),
+            [
+                "https://example.com/blog/atom.xml",
+                "https://example.com/comments.xml",
+            ],
+        )
+        self.assertEqual(
+            scanner.favicons(),
+            [
+                "https://example.com/icon.png",
+                "https://example.com/touch.png",
+                "https://example.com/favicon.ico",
+                "https://example.com/favicon.png",
+            ],
+        )
+
+    def test_falls_back_to_body_links(self):
+        scanner = self.scan(
+            b"<html><head></head><body>",
+            b'<a href="/about">About</a><a href="/feed">Subscribe via <b>RSS</b></a>',
+            b'<a href="/index.xml">Feed</a></body></html>',
+        )
+
+        self.assertFalse(scanner.done)
+        self.assertEqual(
+            scanner.feed_links(),
+            ["https://example.com/feed", "https://example.com/index.xml"],
+        )
+
+
+class TestDiscoverView(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+
+    @mock.patch("feeds.tasks.discover.delay")
+    def test_crawls_in_the_background(self, delay):
+        url = reverse("feeds:feed-discover")
+
+        resp = self.client.get(url, {"q": "example.com"})
+        job_id = resp.context["job_id"]
+        delay.assert_called_once_with(job_id, "http://example.com", self.user.pk)
+
+        # Concurrent lookups of the same site share the job
+        resp = self.client.get(url, {"q": "https://www.example.com/"})
+        self.assertEqual(resp.context["job_id"], job_id)
+        delay.assert_called_once()
+
+        status = self.client.get(reverse("feeds:feed-discover-status", args=[job_id]))
+        self.assertEqual(status.json(), {"stage": "queued"})
+
+    @mock.patch("feeds.tasks.discover.delay")
+    def test_uses_cached_results(self, delay):
+        feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+        discovery.remember("example.com/blog", feed.url)
+        discovery.remember("nofeed.example.com", None)
+
+        resp = self.client.get(
+            reverse("feeds:feed-discover"), {"q": "example.com/blog"}
+        )
+        self.assertEqual(list(resp.context["feeds"]), [feed])
+
+        resp = self.client.get(
+            reverse("feeds:feed-discover"), {"q": "nofeed.example.com"}
+        )
+        self.assertEqual(list(resp.context["feeds"]), [])
+        self.assertIsNone(resp.context["job_id"])
+
+        delay.assert_not_called()
+
+    @override_settings(FEEDS_DISCOVERY_MAX_USER_JOBS=1)
+    @mock.patch("feeds.tasks.discover.delay")
+    def test_releases_job_when_queueing_fails(self, delay):
+        url = reverse("feeds:feed-discover")
+        delay.side_effect = OperationalError("Broker unavailable")
+        with self.assertLogs("feeds.views", "ERROR"):
+            resp = self.client.get(url, {"q": "example.com"})
+        self.assertEqual(resp.status_code, 503)
+        self.assertIsNone(resp.context["job_id"])
+
+        # Neither the user's slot nor the URL's job are left behind
+        delay.side_effect = None
+        resp = self.client.get(url, {"q": "example.com"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(delay.call_count, 2)
+
+    @mock.patch("feeds.tasks.discover.delay")
+    def test_reports_status_from_worker(self, delay):
+        resp = self.client.get(reverse("feeds:feed-discover"), {"q": "example.com"})
+        job_id = resp.context["job_id"]
+
+        # The worker runs in another process, with its own cache connection
+        worker_cache = caches.create_connection("default")
+        crawl = mock.AsyncMock(return_value=(None, None, None))
+        with mock.patch("feeds.discovery.cache", worker_cache), mock.patch(
+            "feeds.crawler.crawl", crawl
+        ):
+            tasks.discover(job_id, "http://example.com", self.user.pk)
+
+        status = self.client.get(reverse("feeds:feed-discover-status", args=[job_id]))
+        self.assertEqual(status.json(), {"stage": "done", "feed_url": None})
+        self.assertEqual(discovery.lookup("example.com"), (True, None))
+
+
+OPML = b"""<?xml version="1.0"?>
+<opml version="1.0">
+  <body>
+    <outline text="Tech">
+      <outline type="rss" text="A" xmlUrl="https://a.example.com/feed" />
+      <outline type="rss" text="B" xmlUrl="https://b.example.com/feed" />
+    </outline>
+    <outline type="rss" text="C" xmlUrl="https://c.example.com/feed" />
+  </body>
+</opml>
+"""
+
+
+class TestImportView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+
+    def test_parses_opml(self):
+        self.assertEqual(
+            list(parse_opml(io.BytesIO(OPML))),
+            [
+                ("https://a.example.com/feed", "Tech"),
+                ("https://b.example.com/feed", "Tech"),
+                ("https://c.example.com/feed", None),
+            ],
+        )
+
+    @mock.patch("feeds.importer.CHUNK_SIZE", 2)
+    @mock.patch("feeds.tasks.import_feeds.delay")
+    def test_fans_out_chunks(self, delay):
+        upload = SimpleUploadedFile("feeds.opml", OPML)
+        resp = self.client.post(reverse("feeds:opml-import"), {"file": upload})
+
+        job = ImportJob.objects.get(user=self.user)
+        self.assertRedirects(resp, job.get_absolute_url())
+        self.assertEqual(job.total, 3)
+        self.assertTrue(job.enqueued)
+        self.assertEqual(delay.call_count, 2)
+
+        advance_job(job.pk, 2, 0)
+        status = self.client.get(reverse("feeds:import-status", args=[job.pk]))
+        self.assertEqual(status.json()["done"], 2)
+        self.assertIsNone(status.json()["finished_at"])
+
+        advance_job(job.pk, 0, 1)
+        status = self.client.get(reverse("feeds:import-status", args=[job.pk]))
+        self.assertIsNotNone(status.json()["finished_at"])
+
+    @mock.patch("feeds.importer.CHUNK_SIZE", 2)
+    @mock.patch("feeds.tasks.import_feeds.delay")
+    def test_releases_records_when_queueing_fails(self, delay):
+        delay.side_effect = [None, OperationalError("Broker unavailable")]
+        upload = SimpleUploadedFile("feeds.opml", OPML)
+        with self.assertLogs("feeds.views", "ERROR"):
+            resp = self.client.post(reverse("feeds:opml-import"), {"file": upload})
+
+        # The chunk that was queued still finishes the job
+        job = ImportJob.objects.get(user=self.user)
+        self.assertRedirects(resp, job.get_absolute_url())
+        self.assertEqual(job.total, 2)
+        self.assertTrue(job.enqueued)
+        ImportRecord.objects.filter(job=job).update(state=ImportRecord.State.DONE)
+        advance_job(job.pk, 2, 0)
+        job.refresh_from_db()
+        self.assertIsNotNone(job.finished_at)
+
+        # The rest are picked up by the next upload
+        delay.side_effect = None
+        upload = SimpleUploadedFile("feeds.opml", OPML)
+        self.client.post(reverse("feeds:opml-import"), {"file": upload})
+        retry = ImportJob.objects.exclude(pk=job.pk).get()
+        self.assertEqual(retry.total, 1)
+        delay.assert_called_with(retry.pk, mock.ANY)
+
+
+class TestExportOPML(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        self.feed = Feed.objects.create(
+            title="Example & co",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+
+    def test_streams_opml(self):
+        category = Category.objects.create(name="Tech", user=self.user)
+        Subscription.objects.create(feed=self.feed, user=self.user, category=category)
+
+        resp = self.client.get(reverse("feeds:opml-export"))
+        content = b"".join(resp.streaming_content)
+
+        self.assertEqual(
+            list(parse_opml(io.BytesIO(content))),
+            [("https://example.com/feed.xml", "Tech")],
+        )
+        self.assertIn(b'title="Example &amp; co"', content)
+
+    async def test_streams_opml_under_asgi(self):
+        await sync_to_async(Subscription.objects.create)(feed=self.feed, user=self.user)
+
+        resp = await self.async_client.get(reverse("feeds:opml-export"))
+        self.assertTrue(resp.is_async)
+        content = b"".join([chunk async for chunk in resp.streaming_content])
+
+        self.assertEqual(
+            list(parse_opml(io.BytesIO(content))),
+            [("https://example.com/feed.xml", None)],
+        )
+
+    def test_not_modified_until_subscriptions_change(self):
+        url = reverse("feeds:opml-export")
+        etag = self.client.get(url)["ETag"]
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        Subscription.objects.create(feed=self.feed, user=self.user)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+
+class TestTimeline(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+        self.feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+
+    def add_entry(self, title, days_ago):
+        return Entry.objects.create(
+            feed=self.feed,
+            title=title,
+            slug=title.lower(),
+            published=timezone.now() - timedelta(days=days_ago),
+        )
+
+    def test_follows_subscriptions(self):
+        older = self.add_entry("Older", 2)
+
+        subscription = Subscription.objects.create(feed=self.feed, user=self.user)
+
+        newer = self.add_entry("Newer", 1)
+        timeline.fan_out([newer])
+
+        resp = self.client.get(reverse("feeds:index"))
+        self.assertEqual(list(resp.context["page_obj"]), [newer, older])
+
+        subscription.delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+
+class TestCursorPaginator(TestCase):
+    def test_pages_by_published_and_id(self):
+        feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+        now = timezone.now()
+        for i in range(8):
+            Entry.objects.create(
+                feed=feed,
+                title=str(i),
+                slug=str(i),
+                # Includes ties on published and entries without a date
+                published=now - timedelta(days=i // 2) if i < 6 else None,
+            )
+        expected = list(feed.entries.order_by("-published", "-pk"))
+
+        paginator = CursorPaginator(feed.entries.all(), 3)
+
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([entry for page in pages for entry in page], expected)
+        self.assertFalse(pages[0].has_previous)
+
+        previous = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), list(pages[-2]))
+
+        # Tampered cursors fall back to the first page
+        self.assertEqual(list(paginator.get_page("nonsense")), list(pages[0]))
+
+
+class TestFeedDetail(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+        self.feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+        now = timezone.now()
+        Entry.objects.bulk_create(
+            Entry(
+                feed=self.feed,
+                title=f"Entry {i}",
+                slug=f"entry-{i}",
+                published=now - timedelta(hours=i),
+            )
+            for i in range(60)
+        )
+
+    def test_subscription_belongs_to_user(self):
+        other = User.objects.create_user("other")
+        Subscription.objects.create(feed=self.feed, user=other)
+
+        resp = self.client.get(self.feed.get_absolute_url())
+        self.assertIsNone(resp.context["subscription"])
+
+        category = Category.objects.create(name="News", user=self.user)
+        subscription = Subscription.objects.create(
+            feed=self.feed, user=self.user, category=category
+        )
+
+        resp = self.client.get(self.feed.get_absolute_url())
+        self.assertEqual(resp.context["subscription"].pk, subscription.pk)
+        self.assertContains(resp, "Category: News")
+
+    def test_cards_skip_entry_html(self):
+        resp = self.client.get(self.feed.get_absolute_url())
+        self.assertTrue(
+            {"content", "summary"}
+            <= resp.context["page_obj"].object_list[0].get_deferred_fields()
+        )
+
+    def test_loads_more_entries(self):
+        resp = self.client.get(self.feed.get_absolute_url(), {"view": "list"})
+        self.assertEqual(len(resp.context["entries"]), 50)
+
+        resp = self.client.get(resp.context["next_url"])
+        self.assertEqual(
+            [entry.title for entry in resp.context["entries"]],
+            [f"Entry {i}" for i in range(50, 60)],
+        )
+        self.assertContains(resp, "<tr>", count=10)
+        self.assertNotIn("X-Next-Page", resp.headers)
+
+
+class TestReadState(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+        self.feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+        Subscription.objects.create(feed=self.feed, user=self.user)
+        self.entries = Entry.objects.bulk_create(
+            Entry(feed=self.feed, title=f"Entry {i}", slug=f"entry-{i}")
+            for i in range(10)
+        )
+
+    def read(self):
+        readstate.annotate(self.user, self.entries)
+        return [i for i, entry in enumerate(self.entries) if entry.is_read]
+
+    def test_encoding(self):
+        ids = [1, 2, 130, 20000, 2**40]
+        self.assertEqual(readstate.decode(readstate.encode(reversed(ids))), ids)
+        self.assertEqual(len(readstate.encode(range(1, 101))), 100)
+
+    @mock.patch("feeds.readstate.COMPACT_AFTER", 2)
+    def test_marks_read(self):
+        self.assertEqual(self.read(), [])
+
+        readstate.mark_read(self.user, [(self.feed.pk, self.entries[3].pk)])
+        self.assertEqual(self.read(), [3])
+
+        # Reading the first few moves the mark up past them
+        pairs = [(self.feed.pk, entry.pk) for entry in self.entries[:3]]
+        readstate.mark_read(self.user, pairs)
+        self.assertEqual(self.read(), [0, 1, 2, 3])
+        state = ReadState.objects.get()
+        self.assertEqual(state.read_up_to, self.entries[3].pk)
+        self.assertEqual(bytes(state.read_ids), b"")
+
+        self.client.post(reverse("feeds:mark-read"), {"feed": self.feed.pk})
+        self.assertEqual(self.read(), list(range(10)))
+
+    @mock.patch("feeds.readstate.COMPACT_AFTER", 4)
+    @mock.patch("feeds.readstate.COMPACT_KEEP", 2)
+    def test_compacts_past_old_unread_entries(self):
+        readstate.refresh_unread(self.user.pk, [self.feed.pk])
+        name = counters.key(counters.UNREAD, self.user.pk, self.feed.pk)
+
+        # The oldest entry is never read, but doesn't hold the mark back
+        read = [1, 2, 3, 4, 6]
+        pairs = [(self.feed.pk, self.entries[i].pk) for i in read]
+        readstate.mark_read(self.user, pairs)
+        self.assertEqual(self.read(), [0, *read])
+        state = ReadState.objects.get()
+        self.assertEqual(state.read_up_to, self.entries[4].pk)
+        self.assertEqual(readstate.decode(state.read_ids), [self.entries[6].pk])
+
+        # The entry given up on no longer counts as unread
+        self.assertEqual(counters.get_many([name]), {name: 4})
+        unread = readstate.unread_counts(Subscription.objects.all())
+        self.assertEqual(unread, {(self.user.pk, self.feed.pk): 4})
+
+    def test_rejects_bad_ids(self):
+        resp = self.client.post(reverse("feeds:mark-read"), {"entry": "one"})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_ignores_feeds_not_subscribed_to(self):
+        other = Feed.objects.create(
+            title="Other",
+            slug="other",
+            link="https://other.example.com",
+            url="https://other.example.com/feed.xml",
+        )
+        entry = Entry.objects.create(feed=other, title="Other", slug="other")
+        read = versions.get(versions.READ, self.user.pk)
+
+        resp = self.client.post(
+            reverse("feeds:mark-read"),
+            {"feed": [other.pk, 99999], "entry": [entry.pk]},
+        )
+        self.assertEqual(resp.json(), {"entries": 0, "feeds": 0})
+        self.assertFalse(ReadState.objects.exists())
+        self.assertEqual(versions.get(versions.READ, self.user.pk), read)
+
+    def test_reading_an_entry_marks_it_read(self):
+        url = self.entries[0].get_absolute_url()
+        self.client.get(url)
+        self.assertEqual(self.read(), [0])
+
+        # Reading it again, or an entry of a feed not subscribed to, writes nothing
+        other = Feed.objects.create(
+            title="Other",
+            slug="other",
+            link="https://other.example.com",
+            url="https://other.example.com/feed.xml",
+        )
+        entry = Entry.objects.create(feed=other, title="Other", slug="other")
+        with mock.patch("feeds.readstate.mark_read") as mark_read:
+            self.assertEqual(self.client.get(url).status_code, 200)
+            resp = self.client.get(entry.get_absolute_url())
+            self.assertEqual(resp.status_code, 200)
+        mark_read.assert_not_called()
+
+
+class TestCounters(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jack")
+        self.feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+
+    def ingest(self, count):
+        entries = [
+            Entry(feed=self.feed, title=f"Entry {i}", slug=f"entry-{i}")
+            for i in range(count)
+        ]
+        ingest_entries(entries)
+        return entries
+
+    def counts(self):
+        return counters.get_many(
+            [
+                counters.key(counters.ENTRIES, self.feed.pk),
+                counters.key(counters.SUBSCRIBERS, self.feed.pk),
+                counters.key(counters.SUBSCRIPTIONS, self.category.pk),
+                counters.key(counters.UNREAD, self.user.pk, self.feed.pk),
+            ]
+        ).values()
+
+    def test_maintained_and_reconciled(self):
+        older = self.ingest(3)
+        self.category = Category.objects.create(name="News", user=self.user)
+        Subscription.objects.create(
+            feed=self.feed, user=self.user, category=self.category
+        )
+        self.assertEqual(list(self.counts()), [3, 1, 1, 3])
+
+        self.ingest(2)
+        readstate.mark_read(self.user, [(self.feed.pk, entry.pk) for entry in older])
+        self.assertEqual(list(self.counts()), [5, 1, 1, 2])
+
+        Counter.objects.update(value=100)
+        counters.reconcile()
+        readstate.reconcile_unread()
+        self.assertEqual(list(self.counts()), [5, 1, 1, 2])
+
+        readstate.mark_all_read(self.user, [self.feed.pk])
+        self.assertEqual(list(self.counts()), [5, 1, 1, 0])
+
+        Subscription.objects.get().delete()
+        self.assertEqual(list(self.counts()), [5, 0, 0, 0])
+        self.assertFalse(Counter.objects.filter(name__startswith="unread:").exists())
+
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+        self.feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+        Subscription.objects.create(feed=self.feed, user=self.user)
+        self.entry = Entry.objects.create(
+            feed=self.feed, title="Hello", slug="hello", published=timezone.now()
+        )
+        timeline.fan_out([self.entry])
+
+    def assertNotModified(self, url):
+        etag = self.client.get(url).headers["ETag"]
+        # Only the session and user are loaded
+        with self.assertNumQueries(2):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertIn("private", resp.headers["Cache-Control"])
+        return etag
+
+    def test_answers_from_versions(self):
+        index = reverse("feeds:index")
+        feed = self.feed.get_absolute_url()
+
+        etags = [self.assertNotModified(url) for url in (index, feed)]
+        self.assertNotModified(self.entry.get_absolute_url())
+
+        # Reading the entry changes how it's shown on both
+        for url, etag in zip((index, feed), etags):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+
+        etags = [self.assertNotModified(url) for url in (index, feed)]
+        entry = Entry.objects.create(feed=self.feed, title="New", slug="new")
+        timeline.fan_out([entry])
+        for url, etag in zip((index, feed), etags):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+
+    def test_expires_with_the_clock(self):
+        index = reverse("feeds:index")
+        etag = self.assertNotModified(index)
+
+        # Relative times on the page have moved on
+        later = timezone.now() + timedelta(seconds=views.FRESHNESS)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            resp = self.client.get(index, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_entry_follows_read_state(self):
+        # The first load marks the entry read, and is validated as such
+        url = self.entry.get_absolute_url()
+        etag = self.assertNotModified(url)
+
+        readstate.mark_all_read(self.user, [self.feed.pk])
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+
+class TestLiveUpdates(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+        self.feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+        Subscription.objects.create(feed=self.feed, user=self.user)
+        self.async_client.force_login(self.user)
+
+    def add_entry(self, title, published):
+        entry = Entry.objects.create(
+            feed=self.feed, title=title, slug=title.lower(), published=published
+        )
+        timeline.fan_out([entry])
+
+    def test_fetches_newer_entries(self):
+        now = timezone.now()
+        self.add_entry("Old", now - timedelta(hours=1))
+        newer_url = self.client.get(reverse("feeds:index")).context["newer_url"]
+
+        with mock.patch("feeds.live.publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add_entry("New", now)
+                self.add_entry("Backdated", now - timedelta(days=1))
+                self.add_entry("Scheduled", now + timedelta(days=1))
+        # Entries that aren't shown yet aren't announced
+        self.assertEqual(
+            [call.args for call in publish.call_args_list],
+            [({self.user.pk: 1},), ({self.user.pk: 1},), ({},)],
+        )
+
+        # Fetched in the order they were ingested, not by publish date
+        resp = self.client.get(newer_url)
+        self.assertContains(resp, "New")
+        self.assertContains(resp, "Backdated")
+        self.assertNotContains(resp, "Old")
+        self.assertNotContains(resp, "Scheduled")
+        self.assertNotIn("X-More", resp.headers)
+
+        # Nothing newer than that yet
+        resp = self.client.get(resp.headers["X-Newer-Page"])
+        self.assertNotContains(resp, "New")
+
+    def test_streams_only_under_asgi(self):
+        url = reverse("feeds:live-updates")
+        self.assertEqual(self.client.get(url).status_code, 204)
+
+        async def stream(user_id):
+            yield "retry: 5000\n\n"
+
+        async def read():
+            resp = await self.async_client.get(url)
+            return resp, b"".join([chunk async for chunk in resp.streaming_content])
+
+        with mock.patch("feeds.live.stream", stream):
+            resp, content = async_to_sync(read)()
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        self.assertEqual(content, b"retry: 5000\n\n")
+
+    def test_streams_published_messages(self):
+        pubsub = mock.AsyncMock()
+        pubsub.get_message.side_effect = [None, {"data": b'{"entries": 2}'}]
+        client = mock.AsyncMock()
+        client.pubsub = mock.Mock(return_value=pubsub)
+
+        async def read(count):
+            stream = live.stream(self.user.pk)
+            events = [await anext(stream) for _ in range(count)]
+            await stream.aclose()
+            return events
+
+        with mock.patch("redis.asyncio.Redis.from_url", return_value=client):
+            events = asyncio.run(read(3))
+
+        pubsub.subscribe.assert_awaited_once_with(live.channel(self.user.pk))
+        self.assertEqual(
+            events[1:], [": keepalive\n\n", 'event: entries\ndata: {"entries": 2}\n\n']
+        )
+        pubsub.close.assert_awaited_once()
+        client.close.assert_awaited_once()
+
+
+class TestSidebar(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+        self.feed = Feed.objects.create(
+            title="Example",
+            slug="example",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+        self.subscription = Subscription.objects.create(feed=self.feed, user=self.user)
+
+    def test_follows_changes(self):
+        self.assertContains(self.client.get(reverse("feeds:profile")), "<b>Example</b>")
+
+        # Refreshing a feed doesn't change the sidebar
+        version = versions.get(versions.SUBSCRIPTIONS, self.user.pk)
+        self.feed.save(update_fields=["last_checked"])
+        self.assertEqual(versions.get(versions.SUBSCRIPTIONS, self.user.pk), version)
+
+        self.feed.title = "Renamed"
+        self.feed.save()
+        resp = self.client.get(reverse("feeds:profile"))
+        self.assertContains(resp, "<b>Renamed</b>")
+
+        self.subscription.delete()
+        resp = self.client.get(reverse("feeds:profile"))
+        self.assertNotContains(resp, "<b>Renamed</b>")
+
+
+class TestQueryPlans(TestCase):
+    """
+    Pins the number of queries every view makes against a synthetic dataset,
+    and the indexes used by the hottest queries, so regressions fail the build
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jack")
+        other = User.objects.create_user("jill")
+        now = timezone.now()
+
+        categories = [
+            Category.objects.create(name=f"Category {i}", user=cls.user)
+            for i in range(3)
+        ]
+
+        for i in range(20):
+            feed = Feed.objects.create(
+                title=f"Feed {i}",
+                slug=f"feed-{i}",
+                link=f"https://{i}.example.com",
+                url=f"https://{i}.example.com/feed.xml",
+            )
+            Entry.objects.bulk_create(
+                Entry(
+                    feed=feed,
+                    title=f"Entry {j}",
+                    slug=f"entry-{j}",
+                    content="<p>Hello</p>",
+                    published=now - timedelta(hours=j * 20 + i),
+                )
+                for j in range(30)
+            )
+            if i < 15:
+                Subscription.objects.create(
+                    feed=feed, user=cls.user, category=categories[i % 4 % 3]
+                )
+            if i % 2:
+                Subscription.objects.create(feed=feed, user=other)
+
+        cls.feed = Feed.objects.get(slug="feed-0")
+        cls.entry = cls.feed.entries.first()
+        cls.category = categories[0]
+        cls.subscription = Subscription.objects.filter(user=cls.user).first()
+        cls.job = ImportJob.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_query_counts(self):
+        views = {
+            "index": (reverse("feeds:index"), 5),
+            "timeline-newer": (reverse("feeds:timeline-newer") + "?after=0", 4),
+            "live-updates": (reverse("feeds:live-updates"), 2),
+            "search": (reverse("feeds:search") + "?q=Entry 1", 5),
+            "feed-list": (reverse("feeds:feed-list"), 3),
+            "opml-export": (reverse("feeds:opml-export"), 3),
+            "opml-import": (reverse("feeds:opml-import"), 2),
+            "import-detail": (self.job.get_absolute_url(), 3),
+            "import-status": (reverse("feeds:import-status", args=[self.job.pk]), 3),
+            "category-list": (reverse("feeds:category-list"), 3),
+            "category-detail": (self.category.get_absolute_url(), 5),
+            "category-delete": (
+                reverse("feeds:category-delete", args=[self.category.pk]),
+                3,
+            ),
+            "profile": (reverse("feeds:profile"), 2),
+            "subscription-delete": (
+                reverse("feeds:subscription-delete", args=[self.subscription.pk]),
+                4,
+            ),
+            "feed-discover": (reverse("feeds:feed-discover") + "?q=Feed 1", 3),
+            "feed-discover-status": (
+                reverse("feeds:feed-discover-status", args=["unknown"]),
+                2,
+            ),
+            "feed-detail": (self.feed.get_absolute_url(), 5),
+            "feed-entries": (
+                reverse("feeds:feed-entries", args=[self.feed.slug]),
+                5,
+            ),
+            "follow": (reverse("feeds:follow", args=["feed-19"]), 4),
+            "entry-detail": (self.entry.get_absolute_url(), 11),
+            "mark-read": (
+                reverse("feeds:mark-read"),
+                10,
+                {"entry": [self.entry.pk], "feed": [self.feed.pk]},
+            ),
+        }
+
+        # Every view needs an entry here
+        self.assertEqual(
+            set(views), {pattern.name for pattern in feeds.urls.urlpatterns}
+        )
+
+        # Navigation comes from the cached sidebar once it's been rendered
+        self.client.get(reverse("feeds:profile"))
+
+        for name, (url, queries, *data) in views.items():
+            with self.subTest(name), self.assertNumQueries(queries):
+                if data:
+                    resp = self.client.post(url, data[0])
+                else:
+                    resp = self.client.get(url)
+                if resp.streaming:
+                    b"".join(resp.streaming_content)
+                # Live updates are only streamed under ASGI
+                expected = 204 if name == "live-updates" else 200
+                self.assertEqual(resp.status_code, expected)
+
+    @skipUnless(connection.vendor == "sqlite", "Checks SQLite query plans")
+    def test_query_plans(self):
+        now = timezone.now()
+        queries = {
+            "feeds_timeline_idx": timeline.for_user(self.user).filter(
+                published__lte=now
+            )[:51],
+            "feeds_entry_feed_pub_idx": self.feed.entries.order_by("-published", "-pk")[
+                :51
+            ],
+            "feeds_sub_user_category_idx": Subscription.objects.filter(
+                user=self.user, category=self.category
+            ),
+            "feeds_sub_user_feed_idx": Subscription.objects.filter(
+                user=self.user
+            ).values_list("feed_id"),
+            "feeds_feed_last_checked": Feed.objects.filter(
+                last_checked__lt=now
+            ).order_by(),
+        }
+
+        for index, queryset in queries.items():
+            with self.subTest(index):
+                plan = queryset.explain()
+                self.assertRegex(plan, rf"USING (COVERING )?INDEX {index}")
+                self.assertNotIn("USE TEMP B-TREE", plan)
+
+
+@skipUnless(connection.vendor == "sqlite", "Uses SQLite FTS5")
+class TestSearch(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jack")
+        self.client.force_login(self.user)
+        self.feed = Feed.objects.create(
+            title="Gardening weekly",
+            slug="gardening",
+            link="https://example.com",
+            url="https://example.com/feed.xml",
+        )
+        Subscription.objects.create(feed=self.feed, user=self.user)
+
+    def add_entry(self, title, content):
+        entry = Entry.objects.create(
+            feed=self.feed,
+            title=title,
+            slug=title.lower(),
+            content=content,
+            published=timezone.now(),
+        )
+        timeline.fan_out([entry])
+        return entry
+
+    def test_ranks_and_highlights_matches(self):
+        in_content = self.add_entry("Spring", "<p>Planting <b>tomatoes</b> early</p>")
+        in_title = self.add_entry("Tomatoes", "<p>All about them</p>")
+        self.add_entry("Autumn", "<p>Raking leaves</p>")
+
+        resp = self.client.get(reverse("feeds:search"), {"q": "tomato"})
+
+        self.assertEqual(list(resp.context["entries"]), [in_title, in_content])
+        self.assertIn("<mark>tomatoes</mark>", resp.context["entries"][1].snippet)
+        self.assertEqual([s.feed for s in resp.context["subscriptions"]], [])
+
+        resp = self.client.get(reverse("feeds:search"), {"q": "garden"})
+        self.assertEqual([s.feed for s in resp.context["subscriptions"]], [self.feed])
+
+    def test_follows_entry_changes(self):
+        entry = self.add_entry("Spring", "<p>Planting tomatoes</p>")
+        entry.content = "<p>Planting potatoes</p>"
+        entry.save()
+
+        self.assertEqual(search_entries(self.user, "tomatoes"), [])
+        self.assertEqual(search_entries(self.user, "potatoes"), [entry])
+
+        entry.delete()
+        self.assertEqual(search_entries(self.user, "potatoes"), [])
+
+    @skipUnless(connection.vendor == "sqlite", "Checks SQLite triggers")
+    def test_restores_dropped_triggers(self):
+        # Every trigger is in place once the test database is migrated
+        self.assertEqual(search.restore_triggers(connection), [])
+
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER feeds_entry_fts_insert")
+        entry = self.add_entry("Tomatoes", "<p>All about them</p>")
+        with self.assertLogs("feeds.search", "WARNING"):
+            restored = search.restore_triggers(connection)
+
+        self.assertEqual(restored, ["feeds_entry_fts_insert"])
+        self.assertEqual(search_entries(self.user, "tomato"), [entry])
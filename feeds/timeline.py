@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.utils import timezone
+
+import feeds.counters as counters
+import feeds.live as live
+import feeds.versions as versions
+from feeds.models import Entry, Feed, Subscription, TimelineEntry
+
+# Rows inserted per statement when writing timelines
+BATCH_SIZE = 1000
+
+
+def fan_out(entries):
+    """Adds newly ingested entries to the timelines of their feeds' subscribers"""
+
+    entries = [entry for entry in entries if entry.pk is not None]
+    if not entries:
+        return
+
+    subscribers = {}
+    for feed_id, user_id in Subscription.objects.filter(
+        feed_id__in={entry.feed_id for entry in entries}
+    ).values_list("feed_id", "user_id"):
+        subscribers.setdefault(feed_id, []).append(user_id)
+
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                feed_id=entry.feed_id,
+                entry_id=entry.pk,
+                published=entry.published,
+            )
+            for entry in entries
+            for user_id in subscribers.get(entry.feed_id, ())
+        ),
+        ignore_conflicts=True,
+        batch_size=BATCH_SIZE,
+    )
+
+    now = timezone.now()
+    unread = {}
+    added = {}
+    for entry in entries:
+        # Entries published in the future aren't shown until then
+        published = entry.published
+        if published is not None and timezone.is_naive(published):
+            published = timezone.make_aware(published)
+        shown = published is not None and published <= now
+        for user_id in subscribers.get(entry.feed_id, ()):
+            name = counters.key(counters.UNREAD, user_id, entry.feed_id)
+            unread[name] = unread.get(name, 0) + 1
+            if shown:
+                added[user_id] = added.get(user_id, 0) + 1
+    counters.add(unread)
+
+    # Open tabs fetch the new entries as soon as they hear, so only once they
+    # can be read
+    transaction.on_commit(lambda: live.publish(added))
+
+    feed_ids = {entry.feed_id for entry in entries}
+    versions.bump_many(
+        versions.FEED,
+        Feed.objects.filter(pk__in=feed_ids).values_list("slug", flat=True),
+    )
+    versions.bump_many(
+        versions.TIMELINE,
+        {user_id for feed_id in feed_ids for user_id in subscribers.get(feed_id, ())},
+    )
+
+
+def backfill(user_id, feed_ids):
+    """Adds the existing entries of newly subscribed to feeds to a timeline"""
+
+    entries = (
+        Entry.objects.filter(feed_id__in=feed_ids)
+        .order_by()
+        .values_list("pk", "feed_id", "published")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id, feed_id=feed_id, entry_id=pk, published=published
+            )
+            for pk, feed_id, published in entries
+        ),
+        ignore_conflicts=True,
+        batch_size=BATCH_SIZE,
+    )
+    versions.bump(versions.TIMELINE, user_id)
+
+
+def remove(user_id, feed_id):
+    TimelineEntry.objects.filter(user_id=user_id, feed_id=feed_id).delete()
+    versions.bump(versions.TIMELINE, user_id)
+
+
+def latest_entry_id(user):
+    """The id of the last entry ingested onto a user's timeline, or 0"""
+
+    latest = (
+        TimelineEntry.objects.filter(user=user)
+        .order_by("-entry_id")
+        .values_list("entry_id", flat=True)
+        .first()
+    )
+    return latest or 0
+
+
+def for_user(user):
+    """A user's timeline, newest first"""
+
+    return (
+        TimelineEntry.objects.select_related("entry__feed")
+        .filter(user=user)
+        .order_by("-published", "-entry_id")
+    )
@@ -5,9 +5,14 @@ from . import views
 app_name = "feeds"
 urlpatterns = [
     path("", views.index, name="index"),
+    path("timeline/newer", views.timeline_newer, name="timeline-newer"),
+    path("timeline/live", views.live_updates, name="live-updates"),
     path("search", views.search, name="search"),
     path("feeds/", views.feed_list, name="feed-list"),
     path("feeds/export/opml", views.export_opml_feeds, name="opml-export"),
+    path("feeds/import/", views.import_opml, name="opml-import"),
+    path("feeds/import/<int:pk>/", views.import_detail, name="import-detail"),
+    path("feeds/import/<int:pk>/status", views.import_status, name="import-status"),
     path("categories/", views.category_list, name="category-list"),
     path(
         "category/<slug:slug>", views.CategoryDetail.as_view(), name="category-detail"
@@ -28,16 +33,27 @@ urlpatterns = [
         views.discover,
         name="feed-discover",
     ),
+    path(
+        "feed/discover/<str:job_id>/status",
+        views.discover_status,
+        name="feed-discover-status",
+    ),
     path(
         "feed/<slug:feed_slug>/",
         views.feed_detail,
         name="feed-detail",
     ),
+    path(
+        "feed/<slug:feed_slug>/entries",
+        views.feed_entries,
+        name="feed-entries",
+    ),
     path(
         "feed/<slug:feed_slug>/follow",
         views.feed_follow,
         name="follow",
     ),
+    path("entries/read", views.mark_read, name="mark-read"),
     path(
         "feed/<slug:feed_slug>/<str:uuid>/<slug:entry_slug>",
         views.entry_detail,
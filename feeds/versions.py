@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.utils import timezone
+
+# The user's subscriptions and categories
+SUBSCRIPTIONS = "subscriptions"
+# The entries on the user's timeline
+TIMELINE = "timeline"
+# Which entries the user has read
+READ = "read"
+# A feed's entries and details, versioned by the feed's slug instead of a user
+FEED = "feed"
+
+
+def cache_key(scope, owner):
+    return f"feeds:version:{scope}:{owner}"
+
+
+def get(scope, owner):
+    """
+    Returns when something in scope last changed for a user, as recorded by
+    bump. If the cache has lost track it's assumed to have just changed
+    """
+
+    key = cache_key(scope, owner)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, timezone.now(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(scope, owner):
+    cache.set(cache_key(scope, owner), timezone.now(), None)
+
+
+def bump_many(scope, owners):
+    now = timezone.now()
+    cache.set_many({cache_key(scope, owner): now for owner in owners}, None)
@@ -1,43 +1,103 @@
+import functools
+import itertools
 import logging
 import uuid
-from typing import List
+from datetime import datetime, timedelta
+from operator import attrgetter, itemgetter
+from typing import List, Optional
+from urllib.parse import urlencode
 
-from asgiref.sync import async_to_sync
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
 from django.db import IntegrityError
-from django.db.models import Count, Exists, OuterRef
-from django.http import HttpRequest, HttpResponse
+from django.db.models import Exists, F, FilteredRelation, OuterRef, Q
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.html import escape
+from django.utils.http import http_date, quote_etag, url_has_allowed_host_and_scheme
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, DeleteView
+from kombu.exceptions import OperationalError
+from lxml import etree
 
-import feeds.crawler as crawler
+import feeds.counters as counters
+import feeds.discovery as discovery
+import feeds.importer as importer
+import feeds.live as live
 import feeds.parser as parser
+import feeds.readstate as readstate
+import feeds.tasks as tasks
+import feeds.timeline as timeline
+import feeds.versions as versions
 
-from .forms import CategoryForm, SignUpForm, SubscriptionForm
-from .models import Category, Entry, Feed, Subscription
-
-# TODO Mechanism to all the subtasks status from a parent tasks
-# Or task status for multiple tasks
+from .forms import CategoryForm, OPMLUploadForm, SignUpForm, SubscriptionForm
+from .models import Category, Entry, Feed, ImportJob, Subscription
+from .pagination import CursorPaginator
+from .search import search_entries, search_subscriptions
 
 logger = logging.getLogger(__name__)
 
+# Number of entries on each page of a feed
+FEED_PAGE_SIZE = 50
 
-def subscriptions_by_category(request: HttpRequest):
-    if request.user.is_authenticated:
-        subscriptions = (
+# Most entries added to the top of the index at once, beyond this it's reloaded
+NEWER_PAGE_SIZE = 50
+
+# Lines of a streamed response sent together under ASGI
+STREAM_CHUNK_SIZE = 500
+
+# Pages show relative times, and entries once their publish date has passed,
+# neither of which bumps a version, so their validators also change every this
+# many seconds
+FRESHNESS = 5 * 60
+
+# How long the sidebar is cached for, it's keyed on the subscriptions version
+# so this only limits how long stale copies linger
+SIDEBAR_TIMEOUT = 60 * 60 * 24
+
+
+def sidebar_subscriptions(user_id: int, version: datetime) -> List[Subscription]:
+    """The user's subscriptions for the sidebar, cached until they next change"""
+
+    return cache.get_or_set(
+        f"feeds:sidebar:{user_id}:{version.timestamp()}",
+        lambda: list(
             Subscription.objects.select_related("category", "feed")
-            .filter(user=request.user)
+            .filter(user_id=user_id)
             .order_by("category__name", "feed__title")
-        )
+        ),
+        SIDEBAR_TIMEOUT,
+    )
 
-        return {"all_subscriptions": subscriptions}
+
+def subscriptions_by_category(request: HttpRequest):
+    if request.user.is_authenticated:
+        version = versions.get(versions.SUBSCRIPTIONS, request.user.pk)
+
+        # Only looked up if the rendered sidebar isn't cached
+        return {
+            "all_subscriptions": functools.partial(
+                sidebar_subscriptions, request.user.pk, version
+            ),
+            "sidebar_version": version.timestamp(),
+            "sidebar_timeout": SIDEBAR_TIMEOUT,
+        }
     return {}
 
 
@@ -47,13 +107,9 @@ def profile(request):
 
 @login_required
 def search(request: HttpRequest):
-    search_term = request.GET.get("q")
-    entries = Entry.objects.prefetch_related("feed__subscriptions").filter(
-        title__icontains=search_term, feed__subscriptions__user=request.user
-    )[:100]
-    subscriptions = Subscription.objects.select_related("feed").filter(
-        feed__title__icontains=search_term, user=request.user
-    )[:100]
+    search_term = request.GET.get("q", "")
+    entries = search_entries(request.user, search_term)
+    subscriptions = search_subscriptions(request.user, search_term)
     return render(
         request,
         "feeds/search.html",
@@ -61,21 +117,198 @@ def search(request: HttpRequest):
     )
 
 
+def iter_opml(subscriptions):
+    """Writes OPML for (category, url, link, title) rows a few lines at a time"""
+
+    yield "<?xml version='1.0' encoding='UTF-8' standalone='no' ?>\n"
+    yield '<opml version="1.0">\n'
+    yield "<head>\n  <title>FeedReader Subscribed feeds</title>\n</head>\n"
+    yield "<body>\n"
+
+    for category, rows in itertools.groupby(subscriptions, key=itemgetter(0)):
+        indent = "  "
+        if category is not None:
+            yield f'  <outline title="{escape(category)}">\n'
+            indent = "    "
+
+        for _, url, link, title in rows:
+            yield (
+                f'{indent}<outline xmlUrl="{escape(url)}" htmlUrl="{escape(link)}"'
+                f' title="{escape(title)}"/>\n'
+            )
+
+        if category is not None:
+            yield "  </outline>\n"
+
+    yield "</body>\n</opml>\n"
+
+
+async def aiter_chunks(iterator, size):
+    """
+    Pulls size items at a time from a sync iterator in a thread, so an ASGI
+    response can be streamed from it (such as one reading from the database)
+    """
+
+    next_chunk = sync_to_async(lambda: "".join(itertools.islice(iterator, size)))
+    while chunk := await next_chunk():
+        yield chunk
+
+
+def streaming_content(request: HttpRequest, iterator, size=STREAM_CHUNK_SIZE):
+    """
+    Content for a StreamingHttpResponse. Under ASGI Django reads a sync
+    iterator into a list before sending any of it, so it's given an async one
+    """
+
+    if isinstance(request, ASGIRequest):
+        return aiter_chunks(iterator, size)
+    return iterator
+
+
+def subscriptions_version(request: HttpRequest) -> datetime:
+    return versions.get(versions.SUBSCRIPTIONS, request.user.pk)
+
+
 @login_required
+@condition(
+    etag_func=lambda request: str(subscriptions_version(request).timestamp()),
+    last_modified_func=subscriptions_version,
+)
 def export_opml_feeds(request: HttpRequest) -> HttpResponse:
     subscriptions = (
-        Subscription.objects.values(
-            "feed__url", "feed__link", "category__name", "feed__title", "feed__subtitle"
+        Subscription.objects.values_list(
+            "category__name", "feed__url", "feed__link", "feed__title"
         )
         .filter(user=request.user)
         .order_by("category__name", "feed__link")
+        .iterator(chunk_size=500)
     )
-    return render(
-        request,
-        "feeds/export_feeds.xml",
-        {"subscriptions": subscriptions},
-        content_type="text/xml",
+    return StreamingHttpResponse(
+        streaming_content(request, iter_opml(subscriptions)), content_type="text/xml"
+    )
+
+
+def page_versions(request: HttpRequest, scopes) -> Optional[List[datetime]]:
+    """
+    Versions of the (scope, owner) pairs a page is built from, or None if the
+    page has to be rendered anyway because there are messages to show
+    """
+
+    if len(messages.get_messages(request)):
+        return None
+    return [versions.get(scope, owner) for scope, owner in scopes]
+
+
+def freshness_stamp() -> datetime:
+    """The start of the current FRESHNESS window"""
+
+    now = timezone.now()
+    return now - timedelta(seconds=now.timestamp() % FRESHNESS)
+
+
+def versioned(scopes):
+    """
+    Answers conditional GETs for a user's page from the versions of what it's
+    built from, before the view runs. scopes is called with the view's
+    arguments and returns (scope, owner) pairs, the sidebar and the current
+    FRESHNESS window are always included
+    """
+
+    def get_versions(request, *args, **kwargs):
+        stamps = page_versions(
+            request,
+            [(versions.SUBSCRIPTIONS, request.user.pk)]
+            + scopes(request, *args, **kwargs),
+        )
+        if stamps is not None:
+            stamps.append(freshness_stamp())
+        return stamps
+
+    def validators(request, stamps):
+        etag = "-".join([str(request.user.pk), *(str(s.timestamp()) for s in stamps)])
+        return quote_etag(etag), int(max(stamps).timestamp())
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = None
+            stamps = get_versions(request, *args, **kwargs)
+            if stamps is not None:
+                etag, last_modified = validators(request, stamps)
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=last_modified
+                )
+
+            if response is None:
+                response = view(request, *args, **kwargs)
+                # The view can change what the page is built from (reading an
+                # entry marks it read), so the validators sent describe the
+                # page as rendered. None are sent if it showed messages
+                stamps = get_versions(request, *args, **kwargs)
+
+            if stamps is not None and response.status_code in (200, 304):
+                etag, last_modified = validators(request, stamps)
+                response.headers["ETag"] = etag
+                response.headers["Last-Modified"] = http_date(last_modified)
+            return response
+
+        # Pages are per user, and checked with the server every time
+        return cache_control(private=True, no_cache=True)(wrapper)
+
+    return decorator
+
+
+@login_required
+def import_opml(request: HttpRequest) -> HttpResponse:
+    if request.method == "POST":
+        form = OPMLUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            job = ImportJob.objects.create(user=request.user)
+
+            # Hand the file to workers a chunk at a time as it's read
+            feeds = importer.parse_opml(form.cleaned_data["file"])
+            try:
+                for chunk in importer.chunked(feeds, importer.CHUNK_SIZE):
+                    record_ids = importer.add_to_job(job, chunk)
+                    if not record_ids:
+                        continue
+                    try:
+                        tasks.import_feeds.delay(job.pk, record_ids)
+                    except OperationalError:
+                        logger.exception("Couldn't queue import chunk")
+                        # Chunks already queued carry on, the rest are released
+                        importer.release_records(job, record_ids)
+                        messages.error(
+                            request,
+                            "Some feeds can't be imported right now, upload the "
+                            "file again shortly",
+                        )
+                        break
+            except etree.XMLSyntaxError:
+                messages.error(request, "Couldn't read all of the OPML file")
+
+            importer.close_job(job)
+            return redirect(job)
+    else:
+        form = OPMLUploadForm()
+
+    return render(request, "feeds/import.html", {"form": form})
+
+
+@login_required
+def import_detail(request: HttpRequest, pk: int) -> HttpResponse:
+    job = get_object_or_404(ImportJob, pk=pk, user=request.user)
+    return render(request, "feeds/import.html", {"job": job})
+
+
+@login_required
+def import_status(request: HttpRequest, pk: int) -> JsonResponse:
+    job = get_object_or_404(
+        ImportJob.objects.values("total", "done", "failed", "finished_at"),
+        pk=pk,
+        user=request.user,
     )
+    return JsonResponse(job)
 
 
 class SignUpFormView(CreateView):
@@ -88,7 +321,9 @@ class CategoryDetail(DetailView, LoginRequiredMixin):
     model = Category
 
     def get_queryset(self):
-        return Category.objects.filter(user=self.request.user)
+        return Category.objects.filter(user=self.request.user).prefetch_related(
+            "subscriptions__feed"
+        )
 
 
 class CategoryDeleteView(DeleteView, LoginRequiredMixin):
@@ -106,7 +341,7 @@ class CategoryDeleteView(DeleteView, LoginRequiredMixin):
 @login_required
 def category_list(request: HttpRequest) -> HttpResponse:
     categories = Category.objects.filter(user=request.user).annotate(
-        Count("subscriptions")
+        subscription_count=counters.lookup(counters.SUBSCRIPTIONS, "pk")
     )
     if request.method == "POST":
         form = CategoryForm(request.POST)
@@ -126,15 +361,101 @@ def category_list(request: HttpRequest) -> HttpResponse:
     )
 
 
+def timeline_scopes(request: HttpRequest):
+    return [(versions.TIMELINE, request.user.pk), (versions.READ, request.user.pk)]
+
+
+def newer_entries_url(request: HttpRequest, after: int) -> str:
+    """Where entries ingested after the entry with the id after are loaded from"""
+
+    query = {"after": after}
+    if "view" in request.GET:
+        query["view"] = request.GET["view"]
+    return f"{reverse('feeds:timeline-newer')}?{urlencode(query)}"
+
+
 @login_required
+@versioned(timeline_scopes)
 def index(request: HttpRequest) -> HttpResponse:
-    entries = Entry.objects.select_related("feed").filter(
-        feed__subscriptions__user=request.user, published__lte=timezone.now()
+    # Cards show the precomputed excerpt, so the entry HTML is never loaded
+    rows = (
+        timeline.for_user(request.user)
+        .filter(published__lte=timezone.now())
+        .defer("entry__content", "entry__summary")
+    )
+    paginator = CursorPaginator(
+        rows, 50, pk="entry_id", key=attrgetter("published", "entry_id")
+    )
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    page_obj.object_list = [row.entry for row in page_obj]
+    parser.sanitize_entries(page_obj)
+    readstate.annotate(request.user, page_obj.object_list)
+
+    # Only the top of the timeline has new entries added to it live
+    newer_url = None
+    if page_obj and not page_obj.has_previous:
+        newer_url = newer_entries_url(request, timeline.latest_entry_id(request.user))
+
+    return render(
+        request, "feeds/index.html", {"page_obj": page_obj, "newer_url": newer_url}
     )
-    paginator = Paginator(entries, 50)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    return render(request, "feeds/index.html", {"page_obj": page_obj})
+
+
+@login_required
+@versioned(timeline_scopes)
+def timeline_newer(request: HttpRequest) -> HttpResponse:
+    """
+    Entries ingested onto the timeline since a newer_entries_url as an HTML
+    fragment, fetched by the index when it's told there are new ones. These go
+    by ingest order rather than publish date, so backdated entries are included
+    """
+
+    try:
+        after = int(request.GET["after"])
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("Expected an entry id")
+
+    rows = list(
+        timeline.for_user(request.user)
+        .filter(entry_id__gt=after, published__lte=timezone.now())
+        .defer("entry__content", "entry__summary")
+        .order_by("entry_id")[: NEWER_PAGE_SIZE + 1]
+    )
+    entries = sorted(
+        (row.entry for row in rows[:NEWER_PAGE_SIZE]),
+        key=attrgetter("published"),
+        reverse=True,
+    )
+    parser.sanitize_entries(entries)
+    readstate.annotate(request.user, entries)
+
+    resp = render(request, "feeds/timeline_entries.html", {"entries": entries})
+    if rows:
+        resp.headers["X-Newer-Page"] = newer_entries_url(
+            request, rows[:NEWER_PAGE_SIZE][-1].entry_id
+        )
+    if len(rows) > NEWER_PAGE_SIZE:
+        # Too many to add to the page, the index offers a reload instead
+        resp.headers["X-More"] = "1"
+    return resp
+
+
+@login_required
+def live_updates(request: HttpRequest) -> HttpResponse:
+    """Server-sent events for new entries on the user's timeline"""
+
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the stream would be buffered until it ended, 204 tells the
+        # browser to stop trying
+        return HttpResponse(status=204)
+
+    resp = StreamingHttpResponse(
+        live.stream(request.user.pk), content_type="text/event-stream"
+    )
+    resp.headers["Cache-Control"] = "no-cache"
+    # Stops proxies holding the events back
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
 
 
 @login_required
@@ -142,36 +463,107 @@ def feed_list(request: HttpRequest) -> HttpResponse:
     subscriptions = (
         Subscription.objects.select_related("feed", "user", "category")
         .filter(user=request.user)
+        .annotate(unread=counters.lookup(counters.UNREAD, "user_id", "feed_id"))
         .order_by("feed__title")
     )
     return render(request, "feeds/feed_list.html", {"subscriptions": subscriptions})
 
 
+def feed_scopes(request: HttpRequest, feed_slug: str):
+    return [(versions.FEED, feed_slug), (versions.READ, request.user.pk)]
+
+
 @login_required
+@versioned(feed_scopes)
 def feed_detail(request: HttpRequest, feed_slug: str) -> HttpResponse:
 
-    # TODO Can this be done in a single query?
-
+    # Joins in the user's subscription (and its category) if they have one, so
+    # the feed and subscription come back in a single query
     queryset = Feed.objects.annotate(
-        subscribed=Exists(Subscription.objects.filter(feed=OuterRef("pk")))
+        subscription=FilteredRelation(
+            "subscriptions", condition=Q(subscriptions__user=request.user)
+        ),
+        subscription_id=F("subscription__id"),
+        category_id=F("subscription__category__id"),
+        category_name=F("subscription__category__name"),
+        category_slug=F("subscription__category__slug"),
+        entry_count=counters.lookup(counters.ENTRIES, "pk"),
     )
 
     feed = get_object_or_404(queryset, slug=feed_slug)
 
-    if feed.subscribed:
-        subscription = Subscription.objects.get(feed=feed, user=request.user)
+    subscription = None
+    if feed.subscription_id is not None:
+        category = None
+        if feed.category_id is not None:
+            category = Category(
+                pk=feed.category_id,
+                name=feed.category_name,
+                slug=feed.category_slug,
+                user=request.user,
+            )
+        subscription = Subscription(
+            pk=feed.subscription_id, feed=feed, user=request.user, category=category
+        )
+
+    paginator = CursorPaginator(
+        feed.entries.defer("content", "summary"), FEED_PAGE_SIZE
+    )
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    readstate.annotate(request.user, page_obj.object_list)
 
     return render(
         request,
         "feeds/feed_detail.html",
         {
-            "subscription": subscription if feed.subscribed else None,
+            "subscription": subscription,
             "feed": feed,
+            "entries": parser.sanitize_entries(page_obj),
+            "page_obj": page_obj,
+            "next_url": next_entries_url(request, feed, page_obj),
         },
     )
 
 
+def next_entries_url(request: HttpRequest, feed: Feed, page_obj) -> Optional[str]:
+    """Where the next page of entries is loaded from as the reader scrolls"""
+
+    if not page_obj.has_next:
+        return None
+    query = {"cursor": page_obj.next_cursor}
+    if "view" in request.GET:
+        query["view"] = request.GET["view"]
+    url = reverse("feeds:feed-entries", kwargs={"feed_slug": feed.slug})
+    return f"{url}?{urlencode(query)}"
+
+
+@login_required
+@versioned(feed_scopes)
+def feed_entries(request: HttpRequest, feed_slug: str) -> HttpResponse:
+    """The next page of a feed's entries as an HTML fragment, for infinite scroll"""
+
+    feed = get_object_or_404(Feed.objects.only("pk", "slug"), slug=feed_slug)
+
+    paginator = CursorPaginator(
+        feed.entries.defer("content", "summary"), FEED_PAGE_SIZE
+    )
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    readstate.annotate(request.user, page_obj.object_list)
+
+    resp = render(
+        request,
+        "feeds/feed_entries.html",
+        {"entries": parser.sanitize_entries(page_obj)},
+    )
+    if next_url := next_entries_url(request, feed, page_obj):
+        resp.headers["X-Next-Page"] = next_url
+    return resp
+
+
+# Entries aren't changed once they're ingested and the URL includes the uuid,
+# so only the sidebar and read state are checked
 @login_required
+@versioned(lambda request, **kwargs: [(versions.READ, request.user.pk)])
 def entry_detail(
     request: HttpRequest, feed_slug: str, uuid: uuid.UUID, entry_slug: str
 ) -> HttpResponse:
@@ -181,13 +573,61 @@ def entry_detail(
         uuid=uuid,
         feed__slug=feed_slug,
     )
+    parser.sanitize_entries([entry])
+
+    # Only feeds the user subscribes to have read state kept for them, and
+    # reading an entry again changes nothing
+    readstate.annotate(request.user, [entry])
+    if (
+        not entry.is_read
+        and Subscription.objects.filter(user=request.user, feed=entry.feed_id).exists()
+    ):
+        readstate.mark_read(request.user, [(entry.feed_id, entry.pk)])
     return render(request, "feeds/entry_detail.html", {"entry": entry})
 
 
+@login_required
+@require_POST
+def mark_read(request: HttpRequest) -> HttpResponse:
+    """
+    Marks the posted entry ids read, and every entry of the posted feed ids.
+    Redirects to next if it's given, otherwise returns how many were marked
+    """
+
+    try:
+        entry_ids = [int(pk) for pk in request.POST.getlist("entry")]
+        feed_ids = [int(pk) for pk in request.POST.getlist("feed")]
+    except ValueError:
+        return HttpResponseBadRequest("Expected entry and feed ids")
+
+    # Only feeds the user is subscribed to have read state kept for them
+    subscribed = Subscription.objects.filter(user=request.user).values_list(
+        "feed_id", flat=True
+    )
+    entries = list(
+        Entry.objects.filter(pk__in=entry_ids, feed_id__in=subscribed).values_list(
+            "feed_id", "pk"
+        )
+    )
+    if feed_ids:
+        feed_ids = list(subscribed.filter(feed_id__in=feed_ids))
+    readstate.mark_read(request.user, entries)
+    readstate.mark_all_read(request.user, feed_ids)
+
+    next_url = request.POST.get("next")
+    if next_url and url_has_allowed_host_and_scheme(
+        next_url, {request.get_host()}, request.is_secure()
+    ):
+        return redirect(next_url)
+    return JsonResponse({"entries": len(entries), "feeds": len(feed_ids)})
+
+
 @login_required
 def discover(request: HttpRequest) -> HttpResponse:
     search_term = request.GET.get("q")
     feeds: List[Feed] = []
+    job_id = None
+    status = 200
 
     if search_term:
         # TODO better way to determine if search_term is possible URL?
@@ -203,36 +643,57 @@ def discover(request: HttpRequest) -> HttpResponse:
         feeds = []
 
         if is_url:
-            try:
-                feed = (
+            subscribed = Exists(
+                Subscription.objects.filter(feed=OuterRef("pk"), user=request.user)
+            )
+
+            found, feed_url = discovery.lookup(search_term)
+
+            if found:
+                logger.info("Cached discovery result for {}".format(search_term))
+                feeds = (
                     Feed.objects.prefetch_related("entries")
-                    .annotate(
-                        subscribed=Exists(
-                            Subscription.objects.filter(
-                                feed=OuterRef("pk"), user=request.user
-                            )
-                        ),
-                    )
-                    .get(url__icontains=parser.strip_scheme(search_term))
+                    .annotate(subscribed=subscribed)
+                    .filter(url=feed_url)
                 )
-            except Feed.DoesNotExist:
-                logger.info("Crawling web for {}".format(search_term))
-                try:
-                    sync_crawl_url = async_to_sync(crawler.crawl)
-                    resp, parsed, favicon = sync_crawl_url(search_term)
-                    if resp is not None:
-                        logger.info("Parsing resp: {}".format(search_term))
-                        feed = crawler.ingest_feed(resp, parsed, favicon)
-                        logger.info("Parsed: {}".format(search_term))
-                        if feed is not None:
-                            feeds = [feed]
-                except Exception as exc:
-                    if settings.DEBUG:
-                        raise
-                    messages.error(request, str(exc))
             else:
-                logger.info("Found pre-existing feed for {}".format(search_term))
-                feeds = [feed]
+                try:
+                    feed = (
+                        Feed.objects.prefetch_related("entries")
+                        .annotate(subscribed=subscribed)
+                        .get(url__icontains=parser.strip_scheme(search_term))
+                    )
+                except Feed.DoesNotExist:
+                    # Crawl in the background, the page polls for the result
+                    try:
+                        job_id, created = discovery.start_job(
+                            search_term, request.user.pk
+                        )
+                    except discovery.Saturated as exc:
+                        messages.error(request, str(exc))
+                        status = 429
+                    else:
+                        if created:
+                            logger.info("Crawling web for {}".format(search_term))
+                            try:
+                                tasks.discover.delay(
+                                    job_id, search_term, request.user.pk
+                                )
+                            except OperationalError:
+                                logger.exception("Couldn't queue discovery job")
+                                # The worker would have released these
+                                discovery.finish_job(search_term, request.user.pk)
+                                messages.error(
+                                    request,
+                                    "Feeds can't be looked up right now, try again "
+                                    "shortly",
+                                )
+                                job_id = None
+                                status = 503
+                else:
+                    logger.info("Found pre-existing feed for {}".format(search_term))
+                    discovery.remember(search_term, feed.url)
+                    feeds = [feed]
         else:
             # First attempt to lookup pre-existing/similar feeds
             search_for = parser.strip_scheme(search_term) if is_url else search_term
@@ -250,7 +711,20 @@ def discover(request: HttpRequest) -> HttpResponse:
             if feeds:
                 logger.info("Found existing matches for: '{}'".format(search_term))
 
-    return render(request, "feeds/discover.html", {"feeds": feeds})
+    return render(
+        request,
+        "feeds/discover.html",
+        {"feeds": feeds, "job_id": job_id},
+        status=status,
+    )
+
+
+@login_required
+def discover_status(request: HttpRequest, job_id: str) -> JsonResponse:
+    status = discovery.job_status(job_id)
+    if status is None:
+        status = {"stage": "unknown"}
+    return JsonResponse(status)
 
 
 def feed_follow(request, feed_slug):